@@ -0,0 +1,100 @@
+"""
+Measures adding contacts from several apps to the same address book at once, and checks that no contact is lost.
+Every writer is a new interpreter that adds its own contacts one command at a time and changes a contact shared by
+all of them now and then, the way several operators would.
+
+Run from the root of the repository:
+
+    python -m benchmarks.concurrency_bench --writers 1 2 4 8
+    python -m benchmarks.concurrency_bench --writers 1 2 4 8 --storage sqlite
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.data_bench import data_file
+from helper_bot.helper_bot.bot import ADDRESS_BOOK_FILE, PICKLE, STORAGE_SUFFIXES, AssistantBot
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+
+SHARED_CONTACT = "Shared contact"
+CHANGE_EVERY = 10
+
+
+def write(storage: str, writer: int, count: int) -> None:
+    """
+    Adds contacts to the address book in the current directory as one of the writers.
+
+    :param storage: pickle or sqlite
+    :param writer: number of the writer, which makes its contacts unique
+    :param count: number of contacts to add
+    """
+
+    bot = AssistantBot(storage, interactive=False)
+    conflicts = 0
+    for number in range(count):
+        bot.handle("contacts", ["add", f"name=Writer {writer} contact {number}", f"phones=06{writer % 10}{number:07d}"])
+        if number % CHANGE_EVERY == 0:
+            result = bot.handle("contacts", ["change", *SHARED_CONTACT.split(), f"address=Writer {writer} {number}"])
+            if result.startswith("ValueError"):
+                conflicts += 1
+    bot.backup_data()
+    print(conflicts)
+
+
+def run(writers: int, count: int, storage: str) -> tuple[float, int, int]:
+    """
+    Starts the writers at once and waits for all of them.
+
+    :param writers: number of writers
+    :param count: number of contacts each writer adds
+    :param storage: pickle or sqlite
+    :return: seconds taken, number of saved contacts and number of refused changes of the shared contact
+    """
+
+    with tempfile.TemporaryDirectory() as folder:
+        filepath = data_file(folder, ADDRESS_BOOK_FILE, storage)
+        book = AddressBook(filepath)
+        book.add_contact(f"name={SHARED_CONTACT}", "phones=0500000000")
+        book.data.backup_data()
+
+        start = time.perf_counter()
+        environment = dict(os.environ, PYTHONPATH=os.getcwd())
+        processes = [subprocess.Popen([sys.executable, "-m", "benchmarks.concurrency_bench", "--write", storage,
+                                       str(writer), str(count)], cwd=folder, env=environment, stdout=subprocess.PIPE,
+                                      text=True)
+                     for writer in range(writers)]
+        conflicts = sum(int(process.communicate()[0]) for process in processes)
+        duration = time.perf_counter() - start
+        if any(process.returncode for process in processes):
+            raise RuntimeError("A writer has failed.")
+        saved = len(RecordsContainer(filepath).data) - 1
+    return duration, saved, conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of apps writing at once")
+    parser.add_argument("--contacts", type=int, default=500, help="contacts added by each writer")
+    parser.add_argument("--storage", choices=tuple(STORAGE_SUFFIXES), default=PICKLE, help="storage of the records")
+    parser.add_argument("--write", nargs=3, metavar=("STORAGE", "WRITER", "COUNT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.write:
+        storage, writer, count = args.write
+        write(storage, int(writer), int(count))
+        return
+
+    print(f"{'writers':>8} {'seconds':>9} {'adds/s':>9} {'saved':>8} {'lost':>6} {'conflicts':>10}")
+    for writers in args.writers:
+        duration, saved, conflicts = run(writers, args.contacts, args.storage)
+        expected = writers * args.contacts
+        print(f"{writers:>8} {duration:>9.2f} {expected / duration:>9.0f} {saved:>8} {expected - saved:>6} "
+              f"{conflicts:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures how many bytes of memory one contact takes with the slotted records and fields, and with records and fields
+that keep their attributes in a __dict__, the way they did before they had slots.
+
+Run from the root of the repository:
+
+    python -m benchmarks.contacts_memory [number_of_contacts]
+"""
+import datetime
+import random
+import sys
+import tracemalloc
+from typing import Any, Callable
+
+from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord, Phone, DATE_FORMAT
+
+DEFAULT_CONTACTS = 100_000
+CITIES = ("Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro")
+
+
+def make_contact(number: int, rnd: random.Random) -> AddressBookRecord:
+    record = AddressBookRecord(f"Contact {number}")
+    record.add_phone(f"067{number:07d}")
+    record.add_phone(f"+38050{number:07d}")
+    birthday = datetime.date(1970, 1, 1) + datetime.timedelta(days=rnd.randrange(15000))
+    record.add_birthday(birthday.strftime(DATE_FORMAT))
+    record.add_email(f"contact{number}@gmail.com")
+    record.add_address(rnd.choice(CITIES))
+    return record
+
+
+class DictField:
+    """
+    A field that keeps its value in a __dict__, like the fields of an address book before they had slots.
+    """
+
+    def __init__(self, value):
+        self._value = value
+
+
+class DictRecord:
+    """
+    A contact that keeps its fields in a __dict__, like AddressBookRecord before it had slots.
+    """
+
+    def __init__(self, name: str):
+        self.name = DictField(name)
+        self.phones = []
+        self.birthday = None
+        self.address = None
+        self.email = None
+
+
+def make_dict_contact(number: int, rnd: random.Random) -> DictRecord:
+    record = DictRecord(f"Contact {number}")
+    record.phones.append(DictField(Phone.normalize(f"067{number:07d}")))
+    record.phones.append(DictField(Phone.normalize(f"+38050{number:07d}")))
+    birthday = datetime.date(1970, 1, 1) + datetime.timedelta(days=rnd.randrange(15000))
+    record.birthday = DictField(datetime.datetime.strptime(birthday.strftime(DATE_FORMAT), DATE_FORMAT).date())
+    record.email = DictField(f"contact{number}@gmail.com")
+    record.address = rnd.choice(CITIES)
+    return record
+
+
+LAYOUTS = {"__dict__": make_dict_contact, "__slots__": make_contact}
+
+
+def measure(contacts_count: int, make: Callable[[int, random.Random], Any]) -> float:
+    """
+    Creates the contacts and returns the number of bytes allocated per contact.
+
+    :param contacts_count: number of contacts to create
+    :param make: creates a contact from its number and a random generator
+    :return: bytes per contact
+    """
+
+    rnd = random.Random(42)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    contacts = [make(number, rnd) for number in range(contacts_count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(contacts) == contacts_count
+    return (after - before) / contacts_count
+
+
+def main():
+    contacts_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CONTACTS
+    print(f"{contacts_count} contacts, bytes per contact:")
+    results = {}
+    for layout, make in LAYOUTS.items():
+        results[layout] = measure(contacts_count, make)
+        print(f"{layout:>10} {results[layout]:>8.0f}")
+    before, after = results["__dict__"], results["__slots__"]
+    print(f"{'saved':>10} {before - after:>8.0f} ({(before - after) / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
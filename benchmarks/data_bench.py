@@ -0,0 +1,203 @@
+"""
+Measures the address book and the notebook on reproducible synthetic data: loading and saving, searches, upcoming
+birthdays, pages of records, adding contacts and renaming notes. Every size is measured in a new interpreter, so the
+peak memory belongs to that size only.
+
+Run from the root of the repository:
+
+    python -m benchmarks.data_bench --sizes 10000 100000 1000000
+    python -m benchmarks.data_bench --sizes 10000 --storage sqlite
+
+The results are compared with benchmarks/data_baseline.json. Save new results as the baseline with --save-baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from helper_bot.helper_bot.bot import ADDRESS_BOOK_FILE, NOTEBOOK_FILE, PICKLE, STORAGE_SUFFIXES
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord, DATE_FORMAT
+from helper_bot.helper_bot.features.notebook import Notebook, NoteRecord
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_baseline.json")
+FIRST_NAMES = ("Ivan", "Olena", "Taras", "Maria", "John", "Anna", "Олена", "Тарас", "Ярина", "Богдан", "Марія", "Іван")
+LAST_NAMES = ("Shevchenko", "Kovalenko", "Smith", "Bondar", "Шевченко", "Коваленко", "Бондар", "Ткаченко")
+CITIES = ("Kyiv", "Lviv", "Odesa", "Київ", "Львів", "Харків")
+OPERATORS = ("067", "050", "093")
+WORDS = ("meeting", "project", "budget", "report", "travel", "idea", "book", "зустріч", "проєкт", "звіт", "подорож",
+         "ідея", "книга", "покупки", "lorem", "ipsum", "dolor", "amet")
+TAGS = ("work", "home", "urgent", "idea", "робота", "дім", "терміново", "later")
+SEARCHES = ("Olena", "Ткаченко", "671234", "Shevchenko 12", "zzzz")
+INSERTS = 1000
+RENAMES = 200
+REPEATS = 5
+
+
+def make_contact(number: int, rnd: random.Random) -> AddressBookRecord:
+    record = AddressBookRecord(f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {number}")
+    for operator in rnd.sample(OPERATORS, rnd.randint(1, len(OPERATORS))):
+        record.add_phone(f"{operator}{number:07d}")
+    birthday = datetime.date(1960, 1, 1) + datetime.timedelta(days=rnd.randrange(20000))
+    record.add_birthday(birthday.strftime(DATE_FORMAT))
+    record.add_email(f"contact{number}@gmail.com")
+    record.add_address(rnd.choice(CITIES))
+    return record
+
+
+def make_note(number: int, rnd: random.Random) -> NoteRecord:
+    text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(50, 300)))
+    return NoteRecord(f"{rnd.choice(WORDS)} {number}", text, rnd.sample(TAGS, rnd.randint(1, 4)))
+
+
+def data_file(folder: str, filename: str, storage: str) -> str:
+    return os.path.join(folder, os.path.splitext(filename)[0] + STORAGE_SUFFIXES[storage])
+
+
+def generate(folder: str, size: int, seed: int, storage: str = PICKLE) -> None:
+    """
+    Creates an address book and a notebook with the given number of records each. The same arguments always produce
+    the same data.
+
+    :param folder: directory to save the files in
+    :param size: number of contacts and of notes
+    :param seed: seed of the random generator
+    :param storage: pickle or sqlite
+    """
+
+    rnd = random.Random(seed)
+    for filename, make_record in ((ADDRESS_BOOK_FILE, make_contact), (NOTEBOOK_FILE, make_note)):
+        container = RecordsContainer(data_file(folder, filename, storage))
+        container.add_records(make_record(number, rnd) for number in range(size))
+        container.backup_data()
+
+
+def median_ms(func: Callable, repeats: int = REPEATS) -> float:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def first_page(result) -> str:
+    return result if isinstance(result, str) else next(result, "")
+
+
+def measure(folder: str, size: int, storage: str) -> dict[str, float]:
+    """
+    Runs the measured operations on the files in the folder.
+
+    :param folder: directory with the generated files
+    :param size: number of records in the files
+    :param storage: pickle or sqlite
+    :return: milliseconds per operation by the name of the operation, and the peak memory
+    """
+
+    results = {}
+    contacts = AddressBook(data_file(folder, ADDRESS_BOOK_FILE, storage))
+    notes = Notebook(data_file(folder, NOTEBOOK_FILE, storage))
+    results["contacts load"] = median_ms(contacts.data.load, 1)
+    results["notes load"] = median_ms(notes.data.load, 1)
+
+    for needle in SEARCHES:
+        results[f"contacts search {needle}"] = median_ms(lambda: contacts.data.search_record(*needle.split()))
+    results["notes search project"] = median_ms(lambda: notes.data.search_record("project"))
+    results["contacts birthdays 7"] = median_ms(lambda: contacts.check_birthdays("7"))
+    results["contacts birthdays 30"] = median_ms(lambda: contacts.check_birthdays("30"))
+    results["contacts show first page"] = median_ms(lambda: first_page(contacts.data.show_all()))
+    results["contacts show page=100"] = median_ms(lambda: first_page(contacts.data.show_all("page=100")))
+    results["contacts show sort=name"] = median_ms(lambda: first_page(contacts.data.show_all("sort=name", "page=1")))
+
+    start = time.perf_counter()
+    for number in range(size, size + INSERTS):
+        contacts.add_contact(f"name=New contact {number}", f"phones=063{number:07d}", "birthday=01.02.1990")
+    results["contacts add, per contact"] = (time.perf_counter() - start) * 1000 / INSERTS
+
+    titles = [key.value for key in list(notes.data)[:RENAMES]]
+    start = time.perf_counter()
+    for title in titles:
+        notes.change_note(title, f"title=renamed {title}")
+    results["notes rename, per note"] = (time.perf_counter() - start) * 1000 / RENAMES
+
+    results["contacts backup"] = median_ms(contacts.data.backup_data, 1)
+    results["notes backup"] = median_ms(notes.data.backup_data, 1)
+    results["peak RSS, MB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def run_size(size: int, seed: int, storage: str) -> dict[str, float]:
+    """
+    Generates the data and measures it in a new interpreter.
+
+    :param size: number of contacts and of notes
+    :param seed: seed of the random generator
+    :param storage: pickle or sqlite
+    :return: the results of measure
+    """
+
+    with tempfile.TemporaryDirectory() as folder:
+        generate(folder, size, seed, storage)
+        output = subprocess.run([sys.executable, "-m", "benchmarks.data_bench", "--storage", storage,
+                                 "--measure", folder, str(size)], check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def print_results(size: int, results: dict[str, float], baseline: dict[str, float]) -> None:
+    print(f"\n{size} contacts and notes")
+    print(f"{'':<32} {'ms':>10} {'ops/s':>10} {'baseline':>10} {'change':>8}")
+    for name, value in results.items():
+        unit_free = name.startswith("peak")
+        throughput = "" if unit_free or not value else f"{1000 / value:.0f}"
+        line = f"{name:<32} {value:>10.2f} {throughput:>10}"
+        if name in baseline and baseline[name]:
+            line += f" {baseline[name]:>10.2f} {(value / baseline[name] - 1) * 100:>+7.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="numbers of contacts and notes")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the random generator")
+    parser.add_argument("--storage", choices=tuple(STORAGE_SUFFIXES), default=PICKLE, help="storage of the records")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="file with the results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--measure", nargs=2, metavar=("FOLDER", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        folder, size = args.measure
+        print(json.dumps(measure(folder, int(size), args.storage)))
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    for size in args.sizes:
+        # The baselines of the pickle storage are keyed by the size alone.
+        key = str(size) if args.storage == PICKLE else f"{size} {args.storage}"
+        results = run_size(size, args.seed, args.storage)
+        print_results(size, results, baseline.get(key, {}))
+        if args.save_baseline:
+            baseline[key] = results
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Measures how the file sorter scales on reproducible synthetic directory trees.
+
+Run from the root of the repository:
+
+    python -m benchmarks.sorter_bench --depth 3 --fanout 4 --files 50
+"""
+import argparse
+import io
+import os
+import random
+import resource
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from helper_bot.helper_bot.features import sorter
+
+UNKNOWN = (".xyz", ".bin", ".cfg", "")
+LATIN_WORDS = ("report", "photo", "song", "movie", "backup", "invoice", "draft", "scan")
+CYRILLIC_WORDS = ("звіт", "фото", "пісня", "фільм", "копія", "рахунок", "чернетка", "скан")
+
+
+def random_name(rnd: random.Random, cyrillic_ratio: float) -> str:
+    words = CYRILLIC_WORDS if rnd.random() < cyrillic_ratio else LATIN_WORDS
+    return f"{rnd.choice(words)} {rnd.randrange(10_000)}"
+
+
+def archive_bytes(rnd: random.Random, extension: str, nested: bool) -> bytes:
+    """
+    Creates a small archive in memory. A nested archive contains another zip archive.
+    """
+    members = {f"inner/{random_name(rnd, 0.5)}{rnd.choice(sorter.DOCS)}": rnd.randbytes(rnd.randrange(64, 4096))
+               for _ in range(rnd.randrange(1, 6))}
+    if nested:
+        members["inner/nested.zip"] = archive_bytes(rnd, ".zip", False)
+
+    buffer = io.BytesIO()
+    if extension == ".zip":
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+    else:
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for name, content in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def generate_tree(root: str, depth: int, fanout: int, files: int, seed: int = 42, archive_ratio: float = 0.02,
+                  cyrillic_ratio: float = 0.3) -> int:
+    """
+    Generates a directory tree with files of all sorted categories, unknown files, Cyrillic names and nested
+    archives. The same arguments always produce the same tree.
+
+    :param root: path to the directory to create the tree in
+    :param depth: number of levels of subdirectories
+    :param fanout: number of subdirectories in every directory
+    :param files: number of files in every directory
+    :param seed: seed of the random generator
+    :param archive_ratio: share of archives among the files
+    :param cyrillic_ratio: share of files with Cyrillic names
+    :return: number of created files
+    """
+    rnd = random.Random(seed)
+    extensions = sorter.IMAGES + sorter.VIDEOS + sorter.DOCS + sorter.AUDIO + UNKNOWN
+    created = 0
+
+    def fill(path: str, level: int) -> None:
+        nonlocal created
+        os.makedirs(path, exist_ok=True)
+        for _ in range(files):
+            if rnd.random() < archive_ratio:
+                extension = rnd.choice((".zip", ".tar.gz"))
+                content = archive_bytes(rnd, extension, nested=rnd.random() < 0.5)
+            else:
+                extension = rnd.choice(extensions)
+                content = rnd.randbytes(rnd.randrange(16, 1024))
+            with open(os.path.join(path, random_name(rnd, cyrillic_ratio) + extension), "wb") as f:
+                f.write(content)
+            created += 1
+        if level < depth:
+            for number in range(fanout):
+                fill(os.path.join(path, random_name(rnd, cyrillic_ratio) + f" {number}"), level + 1)
+
+    fill(root, 0)
+    return created
+
+
+def peak_rss_mb() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def bench_normalized_name(names: int, seed: int) -> float:
+    rnd = random.Random(seed)
+    filenames = [random_name(rnd, 0.5) + rnd.choice(sorter.IMAGES) for _ in range(names)]
+    start = time.perf_counter()
+    for filename in filenames:
+        sorter.normalized_name(filename)
+    return names / (time.perf_counter() - start)
+
+
+def bench_sort(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "root")
+        files = generate_tree(root, args.depth, args.fanout, args.files, args.seed)
+
+        start = time.perf_counter()
+        plan = sorter.build_plan(root)
+        plan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        errors = sorter.execute_plan(plan, args.workers)
+        execute_time = time.perf_counter() - start
+
+        steps = len(plan.folders) + len(plan.moves) + len(plan.renames) + len(plan.extractions) + \
+            len(plan.removed_dirs)
+        total = plan_time + execute_time
+        print(f"files:              {files}")
+        print(f"plan:               {plan_time:.3f} s ({plan.entries} entries, {plan.syscalls} directory reads)")
+        print(f"execute:            {execute_time:.3f} s ({steps} steps, {len(plan.extractions)} archives)")
+        print(f"end to end:         {total:.3f} s, {files / total:.0f} files/s")
+        # Not measured: every directory read and every step of the plan is counted as one system call.
+        print(f"est. syscalls/file: {(plan.syscalls + steps) / files:.2f}")
+        print(f"errors:             {len(errors)}")
+
+        shutil.rmtree(root)
+        generate_tree(root, args.depth, args.fanout, args.files, args.seed)
+        start = time.perf_counter()
+        sorter.sort_folder(root, args.workers, incremental=True)
+        first_run = time.perf_counter() - start
+        start = time.perf_counter()
+        plan = sorter.build_plan(root, sorter.load_manifest(root))
+        second_plan = time.perf_counter() - start
+        print(f"incremental:        first run {first_run:.3f} s, plan of a sorted tree {second_plan:.3f} s "
+              f"({plan.syscalls} directory reads)")
+
+    print(f"normalized_name:    {bench_normalized_name(100_000, args.seed):.0f} names/s")
+    print(f"peak RSS:           {peak_rss_mb():.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3, help="levels of subdirectories")
+    parser.add_argument("--fanout", type=int, default=4, help="subdirectories in every directory")
+    parser.add_argument("--files", type=int, default=50, help="files in every directory")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the random generator")
+    parser.add_argument("--workers", type=int, default=sorter.DEFAULT_WORKERS, help="parallel workers")
+    bench_sort(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures the time from starting the app to the first prompt for address books of different sizes, and the time of
+the first command that needs the contacts.
+
+Run from the root of the repository:
+
+    python -m benchmarks.startup_bench --sizes 0 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.contacts_memory import make_contact
+from helper_bot.helper_bot.bot import ADDRESS_BOOK_FILE
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+
+# Does everything App.run does before showing the first prompt, then the first command that needs the contacts.
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from helper_bot.helper_bot.main import App
+from prompt_toolkit import prompt
+from helper_bot.helper_bot.bot import AssistantBot
+bot = AssistantBot()
+bot.start_autosave()
+ready = time.perf_counter()
+bot.handle("contacts", ["search", "Contact 1"])
+done = time.perf_counter()
+bot.autosaver.stop()
+print(ready - start, done - ready)
+"""
+
+
+def create_address_book(folder: str, contacts_count: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    container = RecordsContainer(os.path.join(folder, ADDRESS_BOOK_FILE))
+    container.add_records(make_contact(number, rnd) for number in range(contacts_count))
+    container.backup_data()
+
+
+def measure(folder: str, repeats: int) -> tuple[float, float]:
+    """
+    Starts the app in a new interpreter several times and returns the best times.
+
+    :param folder: working directory with the saved data
+    :param repeats: number of runs
+    :return: time to the first prompt and time of the first command in seconds
+    """
+
+    environment = dict(os.environ, PYTHONPATH=os.getcwd())
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=folder, env=environment, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(tuple(float(value) for value in output.split()))
+    return min(run[0] for run in runs), min(run[1] for run in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10_000, 100_000],
+                        help="numbers of contacts in the address book")
+    parser.add_argument("--repeats", type=int, default=5, help="runs per size")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the random generator")
+    args = parser.parse_args()
+
+    print(f"{'contacts':>10} {'to prompt, ms':>15} {'first command, ms':>19}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            create_address_book(folder, size, args.seed)
+            to_prompt, first_command = measure(folder, args.repeats)
+        print(f"{size:>10} {to_prompt * 1000:>15.1f} {first_command * 1000:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,27 @@
-from typing import List, Any, Callable
+import os.path
+import threading
+from contextlib import contextmanager, ExitStack
+from importlib import import_module
+from typing import List, Any, Callable, Iterator
 
-from helper_bot.helper_bot.features.addressbook import AddressBook
-from helper_bot.helper_bot.features.files import Files
-from helper_bot.helper_bot.features.notebook import Notebook
+from helper_bot.helper_bot.features.autosave import Autosaver
+from helper_bot.helper_bot.features.metrics import METRICS, CPU, MEMORY, profile_call
 
 ADDRESS_BOOK_FILE = "address_book.bin"
 NOTEBOOK_FILE = "notebook.bin"
+PICKLE = "pickle"
+SQLITE = "sqlite"
+STORAGE_SUFFIXES = {PICKLE: ".bin", SQLITE: ".db"}
+COMPLETIONS_LIMIT = 20
+BOT_COMMANDS = ("help", "stats", "profile")
+
+# Features by their names: the module, the class and the file of its data, if it has any. A feature is imported and
+# created when it is used for the first time, so the startup does not depend on the amount of saved data.
+FEATURES = {
+    "files": ("helper_bot.helper_bot.features.files", "Files", None),
+    "notes": ("helper_bot.helper_bot.features.notebook", "Notebook", NOTEBOOK_FILE),
+    "contacts": ("helper_bot.helper_bot.features.addressbook", "AddressBook", ADDRESS_BOOK_FILE),
+}
 
 
 class AssistantBot:
@@ -13,35 +29,82 @@ class AssistantBot:
     Assists a user with managing the features of the application.
     """
 
-    def __init__(self):
-        self.features = [
-            Files(),
-            Notebook(NOTEBOOK_FILE),
-            AddressBook(ADDRESS_BOOK_FILE)
-        ]
+    def __init__(self, storage: str = PICKLE, interactive: bool = True):
+        if storage not in STORAGE_SUFFIXES:
+            raise ValueError(f"Unknown storage: {storage}. Try {PICKLE} or {SQLITE}.")
+        self.storage = storage
+        self.interactive = interactive
+        self.loaded_features = {}
+        self.commands: dict[tuple[str, str], Callable] = {}
+        self.autosaver = Autosaver()
+        # The batch that is open, which the features created inside it join.
+        self._batch = None
+        # The completer asks for the features from its own thread, so a feature is created under the lock.
+        self._features_lock = threading.Lock()
+        self._help = None
+
+    @property
+    def features(self) -> List[Any]:
+        """
+        All features of the bot, creating those that were not used yet.
+        """
+
+        return [self._get_handler(name) for name in FEATURES]
+
+    @staticmethod
+    def error_message(err: Exception) -> str:
+        """
+        Describes an exception raised by a command for the user.
+
+        :param err: the exception
+        :return: the message
+        """
+
+        if isinstance(err, TypeError):
+            return f"Invalid input, some info is missing: {err}"
+        if isinstance(err, KeyError):
+            return f"Sorry: {err}"
+        if isinstance(err, ValueError):
+            return f"ValueError: {err}"
+        return f"Sorry, something went wrong: {err}"
+
+    @staticmethod
+    def guarded_pages(pages: Iterator[str]) -> Iterator[str]:
+        """
+        Gives out the pages of a command that produces them lazily. An error raised while a page is produced ends the
+        pages with a message instead of ending the app.
+
+        :param pages: the pages
+        :return: the same pages followed by the error message if there was an error
+        """
+
+        try:
+            yield from pages
+        except Exception as err:
+            METRICS.count_error(err)
+            yield AssistantBot.error_message(err)
 
     @staticmethod
     def input_error(func: Callable) -> Callable[[tuple[Any, ...]], str | Any]:
         """
-        A decorator that catches the domain-level exceptions and returns human-readable error message.
+        A decorator that catches the domain-level exceptions and returns human-readable error message. The pages of
+        the commands that produce them lazily get the same treatment while they are read.
         """
 
         def exception_handler(*args, **kwargs):
             try:
                 result = func(*args, **kwargs)
-            except TypeError as err:
-                return f"Invalid input, some info is missing: {err}"
-            except KeyError as err:
-                return f"Sorry: {err}"
-            except ValueError as err:
-                return f"ValueError: {err}"
-            else:
+            except (TypeError, KeyError, ValueError) as err:
+                METRICS.count_error(err)
+                return AssistantBot.error_message(err)
+            if result is None or isinstance(result, str):
                 return result
+            return AssistantBot.guarded_pages(result)
 
         return exception_handler
 
     @input_error
-    def handle(self, handler_name: str, args: List[str]) -> str:
+    def handle(self, handler_name: str, args: List[str]) -> str | Iterator[str]:
         """
         Calls the commands of the features and returns results.
 
@@ -50,41 +113,143 @@ class AssistantBot:
         :return: result of execution of the command
         """
 
-        command_handler = self._get_handler(handler_name)
+        feature = self._get_handler(handler_name)
+        if feature is None:
+            raise ValueError(f"Unexpected command: {handler_name}")
+        if not args:
+            raise ValueError(f"Type a command of {handler_name}, for example: {next(iter(feature.command_handlers))}.")
+
+        command_handler = self.commands.get((handler_name, args[0]))
+        if command_handler is None:
+            raise ValueError(f"Unexpected command: {handler_name} {args[0]}")
+        feature.prepare()
+        with METRICS.command(f"{handler_name} {args[0]}") as timer:
+            return timer.pages(command_handler(*args[1:]))
 
-        if command_handler:
-            command_arguments = args[1:] if len(args) > 1 else []
-            return command_handler.handle_command(args[0], *command_arguments)
-        else:
-            raise ValueError(f"Unexpected command: {command_handler}")
+    def execute(self, command: str, args: List[str]) -> str | Any:
+        """
+        Runs a command of the bot itself, help, stats or profile, or a command of a feature.
+
+        :param command: the first word of the input
+        :param args: the rest of the input
+        :return: result of execution of the command
+        """
+
+        if command == "help":
+            return self.help()
+        if command == "stats":
+            return METRICS.report()
+        if command == "profile":
+            return self.profile(args)
+        return self.handle(command, args)
+
+    def profile(self, args: List[str]) -> str:
+        """
+        Runs one command of a feature under cProfile or tracemalloc and shows its result with the report.
+
+        :param args: cpu or memory followed by the command, e.g. cpu contacts search John
+        :return: the result of the command and the report
+        """
+
+        if len(args) < 2 or args[0] not in (CPU, MEMORY):
+            return f"Type profile {CPU} or profile {MEMORY} followed by a command, e.g. profile {CPU} contacts show."
+        result, report = profile_call(args[0], self.handle, args[1], args[2:])
+        if result is not None and not isinstance(result, str):
+            result = "\n".join(result)
+        return f"{result}\n\n{report}"
 
     def _get_handler(self, handler_name: str) -> Any:
-        handler = next(filter(lambda x: x.name() == handler_name, self.features), None)
+        handler = self.loaded_features.get(handler_name)
+        if handler is not None or handler_name not in FEATURES:
+            return handler
+
+        with self._features_lock:
+            handler = self.loaded_features.get(handler_name)
+            if handler is not None:
+                return handler
+            module_name, class_name, data_file = FEATURES[handler_name]
+            arguments = () if data_file is None else (os.path.splitext(data_file)[0] + STORAGE_SUFFIXES[self.storage],)
+            handler = getattr(import_module(module_name), class_name)(*arguments)
+            handler.interactive = self.interactive
+            for command_name, (command_handler, _) in handler.command_handlers.items():
+                self.commands[(handler_name, command_name)] = command_handler
+            if hasattr(handler, "data"):
+                self.autosaver.watch(handler.data)
+                if self._batch is not None:
+                    self._batch.enter_context(handler.data.batch())
+            # The feature is published last, so another thread never gets it before its commands are registered.
+            self.loaded_features[handler_name] = handler
         return handler
 
-    def autocomplete(self) -> List:
+    def suggest(self, text: str, limit: int = COMPLETIONS_LIMIT) -> tuple[str, list[str]]:
         """
-        Creates a list of autocomplete commands.
+        Suggests how to finish the input: a feature, a command of the feature, or a saved name for the commands that
+        take a name of a contact or a note. The names are looked up in a sorted index, so it takes the same time
+        however many records there are.
 
-        :return: list of possible commands
+        :param text: the input before the cursor
+        :param limit: maximal number of suggestions
+        :return: the part of the input that the suggestions replace and the suggestions
         """
-        result = ["help"]
-        for feature in self.features:
-            for command_name in feature.command_handlers.keys():
-                result.append(f"{feature.name()} {command_name}")
-        return result
+
+        words = text.split()
+        position = len(words) if not text or text[-1].isspace() else len(words) - 1
+        fragment = words[position] if position < len(words) else ""
+        if position == 0:
+            return fragment, [name for name in (*BOT_COMMANDS, *FEATURES) if name.startswith(fragment.lower())][:limit]
+
+        feature = self._get_handler(words[0].lower())
+        if feature is None:
+            return fragment, []
+        if position == 1:
+            return fragment, [command for command in feature.command_handlers
+                              if command.startswith(fragment.lower())][:limit]
+
+        if words[1].lower() not in feature.NAME_COMMANDS:
+            return fragment, []
+        parts = text.split(None, 2)
+        name = parts[2] if len(parts) > 2 else ""
+        if "=" in name:
+            return fragment, []
+        feature.prepare()
+        return name, feature.data.name_index.with_prefix(name, limit)
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the changes of all features made inside the block into one write per feature. The features that are
+        created inside the block join it.
+        """
+
+        with ExitStack() as stack:
+            for handler in list(self.loaded_features.values()):
+                if hasattr(handler, "data"):
+                    stack.enter_context(handler.data.batch())
+            self._batch = stack
+            try:
+                yield self
+            finally:
+                self._batch = None
+
+    def start_autosave(self) -> None:
+        """
+        Starts saving the changed data in the background.
+        """
+
+        self.autosaver.start()
 
     def backup_data(self):
         """
-        Saves user data to files.
+        Stops the autosave and saves user data that changed since the last save to files.
         """
-        for handler in self.features:
+        self.autosaver.stop()
+        for handler in self.loaded_features.values():
             if hasattr(handler, "data"):
-                handler.data.backup_data(handler)
+                handler.data.backup_data()
 
     def help(self) -> str:
-        result = "To work with a bot type in:\n"
-        for feature in self.features:
-            for key, value in feature.command_handlers.items():
-                result += "- " + value[1] + "\n"
-        return result
+        if self._help is None:
+            descriptions = (description for feature in self.features
+                            for _, description in feature.command_handlers.values())
+            self._help = "To work with a bot type in:\n" + "".join(f"- {description}\n" for description in descriptions)
+        return self._help
@@ -0,0 +1,32 @@
+from typing import Iterable
+
+from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
+from prompt_toolkit.document import Document
+
+from helper_bot.helper_bot.bot import AssistantBot
+
+
+class BotCompleter(Completer):
+    """
+    Completes the features, their commands and the saved names of contacts and notes.
+    """
+
+    def __init__(self, bot: AssistantBot):
+        self.bot = bot
+
+    def get_completions(self, document: Document, complete_event) -> Iterable[Completion]:
+        fragment, suggestions = self.bot.suggest(document.text_before_cursor)
+        for suggestion in suggestions:
+            yield Completion(suggestion, start_position=-len(fragment))
+
+
+def make_completer(bot: AssistantBot) -> Completer:
+    """
+    Creates a completer that runs in a background thread, so the first completion of names, which loads the records,
+    does not block typing.
+
+    :param bot: the bot to take the suggestions from
+    :return: a completer for the prompt
+    """
+
+    return ThreadedCompleter(BotCompleter(bot))
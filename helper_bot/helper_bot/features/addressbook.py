@@ -1,97 +1,241 @@
-from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord
-from helper_bot.helper_bot.features.bot_feature import BotFeature
+import copy
+import datetime
+
+from helper_bot.helper_bot.features import transfer
+from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord, Phone, DATE_FORMAT
+from helper_bot.helper_bot.features.bot_feature import BotFeature, field_value, split_arguments
+from helper_bot.helper_bot.features.indexes import BirthdayIndex, PhoneIndex
 from helper_bot.helper_bot.features.records_container import RecordsContainer
 
+CHANGEABLE_FIELDS = ("phone", "email", "address", "birthday")
+
 
 class AddressBook(BotFeature):
     """
     A feature that allows users to manage their contacts.
     """
 
+    NAME_COMMANDS = ("change", "remove")
+
     def __init__(self, save_file: str):
         self.save_file = save_file
         self.data = RecordsContainer(save_file)
+        self.birthdays = self.data.register_index(BirthdayIndex())
+        self.phones = self.data.register_index(PhoneIndex())
 
         super().__init__({
-            "add": (self.add_contact, "contacts add"),
-            "change": (self.change_contact, "contacts change name"),
+            "add": (self.add_contact, "contacts add [name=... phones=... birthday=... email=... address=...]"),
+            "change": (self.change_contact, "contacts change name [phone=... email=... birthday=... address=...]"),
             "remove": (self.data.remove_record, "contacts remove name"),
-            "show": (self.data.show_all, "contacts show"),
+            "show": (self.data.show_all, "contacts show page=N limit=N sort=name"),
             "birthdays": (self.check_birthdays, "contacts birthdays num_of_days"),
-            "search": (self.data.search_record, "contacts search name/phone")
+            "search": (self.data.search_record, "contacts search name/phone"),
+            "phone": (self.find_phone_owner, "contacts phone number"),
+            "prefix": (self.find_phone_prefix, "contacts prefix first_digits_of_phone"),
+            "import": (self.import_contacts, "contacts import file.csv/file.jsonl/file.vcf"),
+            "export": (self.export_contacts, "contacts export file.csv/file.jsonl/file.vcf")
         })
 
     def name(self):
         return "contacts"
 
-    def add_contact(self) -> str:
-        name = input("Enter the name: ").strip()
+    def add_contact(self, *args: str) -> str:
+        """
+        Creates a new contact. Takes the fields as name=, phones=, birthday=, email= and address= options, or asks for
+        them one by one if the command is given without options.
+
+        :param args: fields of the contact as key=value pairs
+        :return: success message
+        """
+
+        options = self.command_options(args)
+        name = field_value(options, "name", "Enter the name: ")
         if self.data.record_exists(name):
             raise ValueError("This name is already in your phonebook. If you want to change something type 'change'.")
 
         record = AddressBookRecord(name)
-        self.data.add_record(record)
-
-        phones = input("Enter the phone or phones: ").strip().split()
+        phones = field_value(options, "phones", "Enter the phone or phones: ").replace(",", " ").split()
         if phones:
             for phone in phones:
+                self._check_phone_is_free(phone, name)
                 record.add_phone(phone)
 
-        birthday = input("Enter the birthdate: ").strip()
+        birthday = field_value(options, "birthday", "Enter the birthdate: ")
         if birthday:
             record.add_birthday(birthday)
 
-        email = input("Enter the email: ").strip()
+        email = field_value(options, "email", "Enter the email: ")
         if email:
             record.add_email(email)
 
-        address = input("Enter the address: ").strip()
+        address = field_value(options, "address", "Enter the address: ")
         if address:
             record.add_address(address)
 
+        # The record is stored only when all its fields are valid.
+        self.data.add_record(record)
         return f"Contact {name} was created successfully!"
 
     def change_contact(self, *args: str) -> str:
         """
-        Changes the contact data. Throws exception if the contact with the given name doesn't exist.
+        Changes the contact data. The new values can be given as phone=, email=, address= and birthday= options after
+        the name, otherwise the user is asked what to change. Throws exception if the contact with the given name
+        doesn't exist.
 
-        :param args: name of a contact to change
+        :param args: name of a contact to change and optionally the new values
         :return: success message or KeyError
         """
 
-        name = " ".join(args)
-        if self.data.record_exists(name):
-            contact_to_change = self.data[name]
-            while True:
-                to_change = input("What do you want to change? Type phone, email, birthday or address: ")
-                if to_change.lower() not in ["phone", "email", "address", "birthday"]:
-                    print("Unknown command")
-                    continue
-                elif to_change.lower() == "phone":
-                    new_phone = input("Enter a new phone: ")
-                    contact_to_change.phones.clear()
-                    contact_to_change.add_phone(new_phone)
-                elif to_change.lower() == "email":
-                    new_email = input("Enter a new email: ")
-                    contact_to_change.add_email(new_email)
-                elif to_change.lower() == "address":
-                    new_address = input("Enter new address here: ")
-                    contact_to_change.add_address(new_address)
-                elif to_change.lower() == "birthday":
-                    new_birthday = input("Enter a birthdate: ")
-                    contact_to_change.add_birthday(new_birthday)
-
-                to_continue = input("Do you want to change something else in this contact? Enter y or n: ")
-                if to_continue.lower() not in ["y", "n"]:
-                    print("Enter y or n.")
-                    continue
-                elif to_continue.lower() == "y":
-                    continue
-                else:
-                    return "The contact was changed successfully!"
-        else:
+        name, options = split_arguments(args)
+        if not self.data.record_exists(name):
             raise KeyError("Contact with this name doesn't exist.")
 
+        contact_to_change = self.data[name]
+        if options:
+            # The fields are changed on a copy, so that an invalid value leaves the saved contact as it was.
+            changed = copy.deepcopy(contact_to_change)
+            for field, value in options.items():
+                self._change_field(changed, field, value)
+            self.data.update_record(changed)
+            return "The contact was changed successfully!"
+        if not self.interactive:
+            raise ValueError("Give the new values as options, e.g. phone=0671234567.")
+
+        while True:
+            to_change = input("What do you want to change? Type phone, email, birthday or address: ")
+            if to_change.lower() not in CHANGEABLE_FIELDS:
+                print("Unknown command")
+                continue
+            new_value = input(f"Enter a new {to_change.lower()}: ")
+            changed = copy.deepcopy(contact_to_change)
+            self._change_field(changed, to_change.lower(), new_value)
+            self.data.update_record(changed)
+            contact_to_change = changed
+
+            to_continue = input("Do you want to change something else in this contact? Enter y or n: ")
+            if to_continue.lower() not in ["y", "n"]:
+                print("Enter y or n.")
+                continue
+            elif to_continue.lower() == "y":
+                continue
+            else:
+                return "The contact was changed successfully!"
+
+    def _change_field(self, contact: AddressBookRecord, field: str, value: str) -> None:
+        if field == "phone":
+            self._check_phone_is_free(value, contact.name.value)
+            contact.phones.clear()
+            contact.add_phone(value)
+        elif field == "email":
+            contact.add_email(value)
+        elif field == "address":
+            contact.add_address(value)
+        elif field == "birthday":
+            contact.add_birthday(value)
+        else:
+            raise ValueError(f"Unknown field: {field}. Type phone, email, birthday or address.")
+
+    def _check_phone_is_free(self, phone: str, name: str) -> None:
+        owner = self.phones.owner(phone)
+        if owner is not None and owner != name:
+            raise ValueError(f"Phone {phone} already belongs to {owner}.")
+
+    def find_phone_owner(self, phone: str) -> str:
+        """
+        Finds the contact who has the given phone.
+
+        :param phone: a phone number in any valid format
+        :return: the contact as a string
+        """
+
+        owner = self.phones.owner(phone)
+        if owner is None:
+            return "No one in your phonebook has this number."
+        return str(self.data[owner])
+
+    def find_phone_prefix(self, prefix: str) -> str:
+        """
+        Finds the contacts whose phones start with the given digits.
+
+        :param prefix: first digits of a phone
+        :return: a list of contacts as a string
+        """
+
+        if not prefix.lstrip("+").isdigit():
+            raise ValueError("Enter the first digits of a phone.")
+
+        owners = self.phones.with_prefix(prefix)
+        if owners:
+            return "\n".join(str(self.data[name]) for name in owners)
+        else:
+            return "No one in your phonebook has a phone starting with these digits."
+
+    def import_contacts(self, *args: str) -> str:
+        """
+        Imports contacts from a CSV, JSONL or vCard file record by record. Rows that can't be imported are written to
+        a report file next to the imported one.
+
+        :param args: path to the file
+        :return: a summary of the import
+        """
+
+        path = " ".join(args)
+        extension = transfer.file_format(path, (transfer.CSV, transfer.JSONL, transfer.VCARD))
+        report_path = path + transfer.ERRORS_SUFFIX
+        imported_phones = set()
+
+        def make_contact(row: dict) -> AddressBookRecord:
+            record = AddressBookRecord((row.get("name") or "").strip())
+            phones = [Phone.normalize(phone) for phone in transfer.split_values(row.get("phones"))]
+            for phone in phones:
+                self._check_phone_is_free(phone, record.name.value)
+                if phone in imported_phones:
+                    raise ValueError(f"Phone {phone} is used in the file more than once.")
+                record.add_phone(phone)
+            if row.get("birthday"):
+                record.add_birthday(row["birthday"].strip())
+            if row.get("email"):
+                record.add_email(row["email"].strip())
+            if row.get("address"):
+                record.add_address(row["address"].strip())
+            return record
+
+        def accept(record: AddressBookRecord) -> None:
+            imported_phones.update(phone.value for phone in record.phones)
+
+        try:
+            with open(path, "r", encoding=transfer.READ_ENCODING, newline="") as f:
+                imported, failed = transfer.import_rows(self.data, transfer.read_rows(f, extension), make_contact,
+                                                        report_path, accept)
+        except OSError as err:
+            return f"Could not import {path}: {err.strerror}."
+        return transfer.import_summary(imported, failed, report_path)
+
+    def export_contacts(self, *args: str) -> str:
+        """
+        Exports all contacts to a CSV, JSONL or vCard file record by record.
+
+        :param args: path to the file
+        :return: success message
+        """
+
+        path = " ".join(args)
+        extension = transfer.file_format(path, (transfer.CSV, transfer.JSONL, transfer.VCARD))
+        rows = ({
+            "name": contact.name.value,
+            "phones": [phone.value for phone in contact.phones],
+            "birthday": contact.birthday.value.strftime(DATE_FORMAT) if contact.birthday else "",
+            "email": contact.email.value if contact.email else "",
+            "address": contact.address or ""
+        } for contact in self.data.values())
+
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                count = transfer.write_rows(f, extension, rows, transfer.CONTACT_FIELDS)
+        except OSError as err:
+            return f"Could not export to {path}: {err.strerror}."
+        return f"Exported {count} contacts to {path}"
+
     def check_birthdays(self, period: str) -> str:
         """
         Creates and returns a list of people who have birthdays in a given period.
@@ -102,15 +246,8 @@ class AddressBook(BotFeature):
         if not period.isdigit():
             raise ValueError("Enter a number of days.")
 
-        result = ""
-        for contact in self.data.values():
-            if contact.birthday is None:
-                continue
-            else:
-                days_to_contacts_bd = contact.count_days_to_birthday()
-                if int(days_to_contacts_bd) <= int(period):
-                    result += str(contact) + "\n"
-        if result:
-            return result
+        birthday_people = self.birthdays.upcoming(datetime.date.today(), int(period))
+        if birthday_people:
+            return "\n".join(str(self.data[name]) for name in birthday_people)
         else:
             return "No one has birthday in this period."
@@ -1,8 +1,29 @@
-from re import match
+import re
 import datetime
+import sys
 from typing import Match
 
 DATE_FORMAT = "%d.%m.%Y"
+COUNTRY_CODE = "38"
+LOCAL_PHONE_LENGTH = 10
+PHONE_REGEX = re.compile(r"(\+?\d{12}|\d{10})")
+EMAIL_REGEX = re.compile(r"[a-zA-Z][a-zA-Z_.0-9]+@[a-zA-Z_]+?\.[a-zA-Z]{2,}")
+
+
+def restore_slots(obj, state) -> None:
+    """
+    Restores the attributes of an unpickled object that uses slots. Accepts the state of objects pickled before the
+    class got slots as well.
+
+    :param obj: an object to restore
+    :param state: the pickled state of the object
+    """
+
+    if isinstance(state, tuple):
+        dict_state, slots_state = state
+        state = {**(dict_state or {}), **(slots_state or {})}
+    for attribute, value in state.items():
+        object.__setattr__(obj, attribute, value)
 
 
 class AddressBookField:
@@ -10,6 +31,8 @@ class AddressBookField:
     The base class for the fields of an addressbook.
     """
 
+    __slots__ = ("_value",)
+
     def __init__(self, value):
         self._value = None
         self.value = value
@@ -26,6 +49,9 @@ class AddressBookField:
     def __contains__(self, needle):
         return True if needle in self.value else False
 
+    def __setstate__(self, state):
+        restore_slots(self, state)
+
     def verify_value(self, value):
         pass
 
@@ -44,6 +70,8 @@ class Name(AddressBookField):
     A name of a person in an addressbook.
     """
 
+    __slots__ = ()
+
     def verify_value(self, value: str) -> None:
         """
         Verifies that name is not smaller than 2 characters long and not bigger than 30 characters. Raises exception if
@@ -61,9 +89,17 @@ class Phone(AddressBookField):
     A phone number of a person in an address book.
     """
 
+    __slots__ = ()
+
     @classmethod
     def is_valid(cls, value: str) -> None | Match[str]:
-        return match(r"(\+?\d{12}|\d{10})", value)
+        """
+        Checks if the whole value is a phone number. A longer number is not valid rather than cut to the right length.
+
+        :param value: phone number
+        """
+
+        return PHONE_REGEX.fullmatch(value)
 
     def verify_value(self, value: str) -> None:
         """
@@ -75,12 +111,33 @@ class Phone(AddressBookField):
         if not Phone.is_valid(value):
             raise ValueError("Invalid phone format. Try +123456789012 or 1234567890.")
 
+    @classmethod
+    def normalize(cls, value: str) -> str:
+        """
+        Brings the phone to the international format, e.g. 0671234567 and 380671234567 become +380671234567. Raises
+        exception if the phone is in a wrong format.
+
+        :param value: phone number
+        :return: normalized phone number
+        """
+
+        valid_phone = cls.is_valid(value)
+        if not valid_phone:
+            raise ValueError(f"Phone must be in format +380XXXXXXXXX/380XXXXXXXXX/0XXXXXXXXX")
+
+        digits = valid_phone.group(0).lstrip("+")
+        if len(digits) == LOCAL_PHONE_LENGTH:
+            digits = COUNTRY_CODE + digits
+        return "+" + digits
+
 
 class Birthday(AddressBookField):
     """
     Person's birthday date.
     """
 
+    __slots__ = ()
+
     def verify_value(self, value: datetime.date) -> None:
         """
         Checks if the birthdate is not in the future. Raises exception if the date is in the future.
@@ -97,6 +154,8 @@ class Email(AddressBookField):
     Person's email.
     """
 
+    __slots__ = ()
+
     @classmethod
     def is_valid(cls, value: str) -> None | Match[str]:
         """
@@ -105,7 +164,7 @@ class Email(AddressBookField):
         :param value: email to check
         """
 
-        return match(r"[a-zA-Z][a-zA-Z_.0-9]+@[a-zA-Z_]+?\.[a-zA-Z]{2,}", value)
+        return EMAIL_REGEX.match(value)
 
 
 class AddressBookRecord:
@@ -114,6 +173,8 @@ class AddressBookRecord:
     be omitted.
     """
 
+    __slots__ = ("name", "phones", "birthday", "address", "email")
+
     def __init__(self, name: str):
         if not name:
             raise ValueError("The record must have a name.")
@@ -123,38 +184,17 @@ class AddressBookRecord:
         self.address = None
         self.email = None
 
+    def __setstate__(self, state):
+        restore_slots(self, state)
+
     def add_phone(self, phone: str) -> None:
         """
-        Adds a phone to the record. Raises exception if the phone is in a wrong format.
+        Adds a phone to the record in the normalized format. Raises exception if the phone is in a wrong format.
 
         :param phone: a phone number
         """
 
-        if Phone.is_valid(phone):
-            phone_object = Phone(phone)
-            self.phones.append(phone_object)
-        else:
-            raise ValueError(f"Phone must be in format +380XXXXXXXXX/380XXXXXXXXX/0XXXXXXXXX")
-
-    def count_days_to_birthday(self) -> str:
-        """
-        Counts the days left to the birthdate of the given person.
-
-        :return: a number of days left
-        """
-
-        today = datetime.datetime.now().date()
-        this_years_birthday = self.birthday.value.replace(year=today.year)
-
-        if today < this_years_birthday:
-            difference = this_years_birthday - today
-            return difference.days
-        if today == this_years_birthday:
-            return "0"
-        else:
-            next_years_birthday = this_years_birthday.replace(year=this_years_birthday.year + 1)
-            difference = next_years_birthday - today
-            return difference.days
+        self.phones.append(Phone(Phone.normalize(phone)))
 
     def add_birthday(self, birthday: str) -> None:
         """
@@ -189,7 +229,32 @@ class AddressBookRecord:
         :param args: contact's address
         """
 
-        self.address = " ".join(args)
+        self.address = sys.intern(" ".join(args))
+
+    def searchable_fields(self) -> list[str]:
+        """
+        Returns the values of the fields that can be searched.
+
+        :return: a list of field values
+        """
+
+        fields = [str(self.name), *map(str, self.phones)]
+        for field in (self.birthday, self.email, self.address):
+            if field is not None:
+                fields.append(str(field))
+        return fields
+
+    def short_fields(self) -> list[str]:
+        """
+        Returns the values of the fields that are short enough to be searched for any part of them.
+
+        :return: a list of field values
+        """
+
+        fields = [str(self.name), *map(str, self.phones)]
+        if self.email is not None:
+            fields.append(str(self.email))
+        return fields
 
     def __str__(self):
         phones = ", ".join(map(lambda phone: str(phone), self.phones)) if self.phones else "no saved phones"
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Iterable
+
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+
+SAVE_INTERVAL = 30.0
+SAVE_AFTER_CHANGES = 100
+CHECK_INTERVAL = 0.5
+
+
+class Autosaver:
+    """
+    Saves the changed containers in a background thread.
+
+    Every change is appended to the journal of its container right away, so the autosaver only has to sync the
+    journals to the disk, and to compact a journal into a new snapshot when it has grown long enough. A container is
+    saved when it has unsaved changes older than the save interval or when the number of unsaved changes reaches the
+    limit. The containers that did not change are never touched.
+    """
+
+    def __init__(self, containers: Iterable[RecordsContainer] = (), interval: float = SAVE_INTERVAL,
+                 max_changes: int = SAVE_AFTER_CHANGES):
+        self.containers = list(containers)
+        self.interval = interval
+        self.max_changes = max_changes
+        self.saves = 0
+        self.errors = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def watch(self, container: RecordsContainer) -> None:
+        """
+        Adds a container to save, for example the container of a feature created after the start.
+
+        :param container: a container to save
+        """
+
+        container.autosaved = self._thread is not None
+        self.containers.append(container)
+
+    def start(self) -> None:
+        """
+        Starts saving the containers in the background. The containers stop compacting their journals by themselves.
+        """
+
+        if self._thread is not None:
+            return
+        for container in self.containers:
+            container.autosaved = True
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the background thread and gives the compaction back to the containers.
+        """
+
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        for container in self.containers:
+            container.autosaved = False
+
+    def _run(self) -> None:
+        while not self._stopped.wait(min(CHECK_INTERVAL, self.interval)):
+            self.save_due()
+
+    def save_due(self) -> None:
+        """
+        Saves the containers whose unsaved changes reached the time or the count threshold.
+        """
+
+        now = time.monotonic()
+        for container in self.containers:
+            if not container.unsaved_changes:
+                continue
+            if container.unsaved_changes >= self.max_changes or now - container.saved_at >= self.interval:
+                try:
+                    if container.save():
+                        self.saves += 1
+                except OSError as err:
+                    # The changes are still in the journal, so the next attempt will save them.
+                    self.errors.append(err)
@@ -1,4 +1,50 @@
-from typing import List, Callable
+def parse_options(args: tuple[str, ...]) -> dict[str, str]:
+    """
+    Parses the arguments given as key=value pairs. Raises exception if an argument is not a pair.
+
+    :param args: arguments of a command
+    :return: a dictionary of options
+    """
+
+    options = {}
+    for arg in args:
+        key, separator, value = arg.partition("=")
+        if not separator:
+            raise ValueError(f"Expected an option in format key=value, got '{arg}'.")
+        options[key.lower()] = value
+    return options
+
+
+def split_arguments(args: tuple[str, ...]) -> tuple[str, dict[str, str]]:
+    """
+    Separates the leading words of the arguments, such as a name or a path that may contain spaces, from the
+    key=value options that follow them.
+
+    :param args: arguments of a command
+    :return: the leading words joined with spaces and the options
+    """
+
+    words = list(args)
+    option_parts = []
+    while words and "=" in words[-1]:
+        option_parts.insert(0, words.pop())
+    return " ".join(words), parse_options(tuple(option_parts))
+
+
+def field_value(options: dict[str, str] | None, key: str, question: str) -> str:
+    """
+    Takes the value of a field from the options given with a command, or asks the user for it if the command was
+    given without options.
+
+    :param options: options of the command, or None to ask the user for every field
+    :param key: name of the field
+    :param question: what to ask the user
+    :return: value of the field
+    """
+
+    if options is None:
+        return input(question).strip()
+    return options.get(key, "").strip()
 
 
 class BotFeature:
@@ -6,6 +52,11 @@ class BotFeature:
     A base class that handles commands for the features.
     """
 
+    # Commands whose argument is a name of a record, so it can be completed from the saved names.
+    NAME_COMMANDS = ()
+    # The script mode turns it off, so that the commands never wait for an answer of the user.
+    interactive = True
+
     def __init__(self, command_handlers: dict[str, tuple]):
         self.command_handlers = command_handlers
 
@@ -13,9 +64,25 @@ class BotFeature:
     def name():
         pass
 
-    def handle_command(self, command: str, *args: List[str]):
-        handler, _ = self.command_handlers.get(command, None)
-        if handler:
-            return handler(*args)
-        else:
-            raise ValueError("Unexpected command")
+    def command_options(self, args: tuple[str, ...]) -> dict[str, str] | None:
+        """
+        Parses the options of a command that asks the user for its fields when it is given without options.
+
+        :param args: arguments of the command
+        :return: the options, or None if the user should be asked
+        """
+
+        if args or not self.interactive:
+            return parse_options(args)
+        return None
+
+    def prepare(self) -> None:
+        """
+        Loads the records of the feature, if it has any, so that its indexes are filled before any query, and merges
+        the changes that other apps have saved since.
+        """
+
+        data = getattr(self, "data", None)
+        if data is not None:
+            data.load()
+            data.refresh()
@@ -1,4 +1,8 @@
 from abc import abstractmethod, ABC
+from itertools import islice
+from typing import Iterable, Iterator
+
+PAGE_SIZE = 20
 
 
 class DataPresenter(ABC):
@@ -11,8 +15,18 @@ class DataPresenter(ABC):
 class RecordsPresenter(DataPresenter):
 
     @staticmethod
-    def show_data(data: dict) -> str:
-        result = ""
-        for record in data.values():
-            result += "\n" + str(record) + "\n"
-        return result
+    def show_data(records: Iterable, page_size: int = PAGE_SIZE) -> Iterator[str]:
+        """
+        Formats the records page by page. Only the records of the page that is being shown are formatted.
+
+        :param records: records to show
+        :param page_size: number of records on a page
+        :return: pages of records as strings
+        """
+
+        records = iter(records)
+        while True:
+            page = list(islice(records, page_size))
+            if not page:
+                return
+            yield "".join(f"\n{record}\n" for record in page)
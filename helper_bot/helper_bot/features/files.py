@@ -1,6 +1,8 @@
-from helper_bot.helper_bot.features.sorter import sort_folder
-from helper_bot.helper_bot.features.bot_feature import BotFeature
+from helper_bot.helper_bot.features.sorter import build_plan, find_duplicates, link_duplicates, sort_folder, \
+    FolderWatcher, DEFAULT_WORKERS, WATCH_INTERVAL
+from helper_bot.helper_bot.features.bot_feature import BotFeature, split_arguments
 import os.path
+from typing import Iterator
 
 
 class Files(BotFeature):
@@ -10,7 +12,10 @@ class Files(BotFeature):
 
     def __init__(self):
         super().__init__({
-            "sort": (self.sort, "files sort path")
+            "sort": (self.sort, "files sort path workers=N incremental=yes"),
+            "plan": (self.plan, "files plan path"),
+            "dedup": (self.dedup, "files dedup path link=yes workers=N"),
+            "watch": (self.watch, "files watch path interval=seconds")
         })
 
     def name(self):
@@ -21,13 +26,79 @@ class Files(BotFeature):
         """
         Sorts the folder. Catches system errors when the operating system tries to reach the path.
 
-        :param args:
-        :return:
+        :param args: path to the folder and optionally workers=N, the number of parallel workers, and incremental=yes
+            to skip the folders that did not change since the previous incremental sort
+        :return: result of sorting
         """
-        
-        path = " ".join(args)
+
+        path, options = split_arguments(args)
+        workers = int(options.get("workers", DEFAULT_WORKERS))
+        if workers < 1:
+            raise ValueError("Number of workers must be positive.")
+
         if os.path.exists(path):
-            sort_folder(path)
+            errors = sort_folder(path, workers, options.get("incremental", "no").lower() in ("yes", "true", "1"))
+            if errors:
+                return "Folder is sorted, but some files could not be sorted:\n" + \
+                    "\n".join(f"{source}: {error}" for source, error in errors)
             return "Folder is sorted"
         else:
-            return "Path does not exist. Try again."
\ No newline at end of file
+            return "Path does not exist. Try again."
+
+    @staticmethod
+    def plan(*args: str) -> str | Iterator[str]:
+        """
+        Shows what sorting the folder would do without changing anything.
+
+        :param args: path to the folder
+        :return: the steps of sorting one by one
+        """
+
+        path = " ".join(args)
+        if os.path.isdir(path):
+            return build_plan(path).describe()
+        else:
+            return "Path does not exist. Try again."
+
+    @staticmethod
+    def dedup(*args: str) -> str:
+        """
+        Finds identical files in the sorted folder and optionally replaces the copies with hard links.
+
+        :param args: path to the folder and optionally link=yes to link the copies and workers=N
+        :return: the groups of identical files
+        """
+
+        path, options = split_arguments(args)
+        workers = int(options.get("workers", DEFAULT_WORKERS))
+        if workers < 1:
+            raise ValueError("Number of workers must be positive.")
+        if not os.path.isdir(path):
+            return "Path does not exist. Try again."
+
+        groups = find_duplicates(path, workers)
+        if not groups:
+            return "No duplicates found."
+
+        result = "\n\n".join("\n".join(group) for group in groups)
+        if options.get("link", "no").lower() in ("yes", "true", "1"):
+            freed = link_duplicates(groups)
+            result += f"\n\nDuplicates were replaced with hard links, {freed} bytes freed."
+        return result
+
+    @staticmethod
+    def watch(*args: str) -> str | Iterator[str]:
+        """
+        Keeps the folder sorted until the user presses Ctrl+C.
+
+        :param args: path to the folder and optionally interval=N, the number of seconds between checks
+        :return: messages about the sorted files one by one
+        """
+
+        path, options = split_arguments(args)
+        interval = float(options.get("interval", WATCH_INTERVAL))
+        if interval <= 0:
+            raise ValueError("Interval must be positive.")
+        if not os.path.isdir(path):
+            return "Path does not exist. Try again."
+        return FolderWatcher(path).watch(interval)
@@ -0,0 +1,594 @@
+import re
+from abc import abstractmethod, ABC
+from bisect import bisect_left, insort
+from calendar import isleap
+from datetime import date, timedelta
+from collections import Counter
+from functools import reduce
+from heapq import nlargest
+from math import log
+
+from helper_bot.helper_bot.features.addressbook_fields import Phone, COUNTRY_CODE
+
+TOKEN_REGEX = re.compile(r"\w+")
+
+# Days of the year are counted in a leap year, so that February 29 has its own place between February 28 and March 1.
+LEAP_YEAR = 2000
+FEBRUARY_29 = 60
+MARCH_1 = 61
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits the text into normalized lowercase words.
+
+    :param text: a text to split
+    :return: a list of tokens
+    """
+
+    return TOKEN_REGEX.findall(text.lower())
+
+
+def searchable_text(record) -> str:
+    """
+    Joins the searchable fields of the record into one string.
+
+    :param record: a record of a container
+    :return: the text to search in
+    """
+
+    if hasattr(record, "searchable_fields"):
+        return "\n".join(record.searchable_fields())
+    return str(record)
+
+
+def short_text(record) -> str:
+    """
+    Joins the short fields of the record into one string, or all its searchable fields if it has no short ones.
+
+    :param record: a record of a container
+    :return: the text to search in
+    """
+
+    if hasattr(record, "short_fields"):
+        return "\n".join(record.short_fields())
+    return searchable_text(record)
+
+
+class RecordIndex(ABC):
+    """
+    A base class for indexes that a records container keeps in sync with its records.
+    """
+
+    # Persistent indexes are kept by the storage of the container, so the container does not fill them.
+    persistent = False
+
+    @abstractmethod
+    def add(self, key: str, record) -> None:
+        pass
+
+    @abstractmethod
+    def discard(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class TokenIndex(RecordIndex):
+    """
+    An inverted index that maps normalized words to the names of the records that contain them.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, set[str]] = {}
+        self.tokens_by_key: dict[str, set[str]] = {}
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        tokens = set(tokenize(searchable_text(record)))
+        self.tokens_by_key[key] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(key)
+
+    def discard(self, key: str) -> None:
+        for token in self.tokens_by_key.pop(key, ()):
+            keys = self.postings[token]
+            keys.discard(key)
+            if not keys:
+                del self.postings[token]
+
+    def clear(self) -> None:
+        self.postings.clear()
+        self.tokens_by_key.clear()
+
+    def search(self, query: str) -> set[str]:
+        """
+        Finds the records that contain every word of the query.
+
+        :param query: words to search
+        :return: names of the matching records
+        """
+
+        postings = [self.postings.get(token, set()) for token in tokenize(query)]
+        if not postings:
+            return set()
+        postings.sort(key=len)
+        return reduce(set.intersection, postings[1:], set(postings[0]))
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Splits the text into all its substrings of three characters.
+
+    :param text: a text to split
+    :return: a set of trigrams
+    """
+
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex(RecordIndex):
+    """
+    An index of three-character substrings that finds the records containing an arbitrary part of a short field, such
+    as a piece of a phone number or the middle of a name. Long fields, like the text of a note, are left to the token
+    index, since their trigrams would take much longer to build than the words.
+
+    The trigrams are built by the first search, so loading many records only keeps their short text.
+    """
+
+    MIN_QUERY_LENGTH = 3
+    # The words of the long fields have to be searched with the token index.
+    short_fields_only = True
+
+    def __init__(self):
+        self.postings: dict[str, set[str]] | None = None
+        self.texts: dict[str, str] = {}
+        # Number of texts the last search compared with the needle.
+        self.scanned = 0
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        text = short_text(record).lower()
+        self.texts[key] = text
+        if self.postings is not None:
+            for trigram in trigrams(text):
+                self.postings.setdefault(trigram, set()).add(key)
+
+    def discard(self, key: str) -> None:
+        text = self.texts.pop(key, None)
+        if text is None or self.postings is None:
+            return
+        for trigram in trigrams(text):
+            keys = self.postings[trigram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[trigram]
+
+    def clear(self) -> None:
+        self.postings = None
+        self.texts.clear()
+
+    def _build(self) -> None:
+        self.postings = {}
+        for key, text in self.texts.items():
+            for trigram in trigrams(text):
+                self.postings.setdefault(trigram, set()).add(key)
+
+    def search(self, needle: str) -> set[str]:
+        """
+        Finds the records whose short fields contain the needle. The needle must be at least three characters long.
+
+        :param needle: a substring to search
+        :return: names of the matching records
+        """
+
+        if self.postings is None:
+            self._build()
+        needle = needle.lower()
+        self.scanned = 0
+        postings = []
+        for trigram in trigrams(needle):
+            keys = self.postings.get(trigram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for keys in postings[1:]:
+            candidates = candidates & keys
+            if not candidates:
+                return set()
+        self.scanned = len(candidates)
+        return {key for key in candidates if needle in self.texts[key]}
+
+    def scan(self, needle: str) -> set[str]:
+        """
+        Checks the short fields of every record for the needle. Works for needles of any length.
+
+        :param needle: a substring to search
+        :return: names of the matching records
+        """
+
+        needle = needle.lower()
+        self.scanned = len(self.texts)
+        return {key for key, text in self.texts.items() if needle in text}
+
+
+def day_of_year(day: date) -> int:
+    """
+    Returns the number of the day in a leap year that has the same month and day as the given date.
+
+    :param day: a date
+    :return: a number from 1 to 366
+    """
+
+    return date(LEAP_YEAR, day.month, day.day).timetuple().tm_yday
+
+
+class BirthdayIndex(RecordIndex):
+    """
+    A sorted index of birthdays by day of the year that answers which records have birthdays in a given period.
+
+    The sorted list is built by the first lookup, so loading many records does not pay for keeping it sorted. After
+    that, every change updates the list in place.
+    """
+
+    def __init__(self):
+        self.entries: list[tuple[int, str]] | None = None
+        self.days_by_key: dict[str, int] = {}
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        if record.birthday is None:
+            return
+        day = day_of_year(record.birthday.value)
+        self.days_by_key[key] = day
+        if self.entries is not None:
+            insort(self.entries, (day, key))
+
+    def discard(self, key: str) -> None:
+        day = self.days_by_key.pop(key, None)
+        if day is not None and self.entries is not None:
+            del self.entries[bisect_left(self.entries, (day, key))]
+
+    def clear(self) -> None:
+        self.entries = None
+        self.days_by_key.clear()
+
+    def _between(self, first_day: int, last_day: int) -> list[str]:
+        if self.entries is None:
+            self.entries = sorted((day, key) for key, day in self.days_by_key.items())
+        start = bisect_left(self.entries, (first_day, ""))
+        end = bisect_left(self.entries, (last_day + 1, ""))
+        return [key for _, key in self.entries[start:end]]
+
+    def upcoming(self, today: date, period: int) -> list[str]:
+        """
+        Finds the records that have birthdays from today till the end of the period. Birthdays on February 29 are
+        celebrated on March 1 in common years.
+
+        :param today: the first day of the period
+        :param period: number of days after today
+        :return: names of the records in the order of their birthdays
+        """
+
+        last = today + timedelta(days=min(period, 365))
+        result = []
+        start = today
+        while start <= last:
+            end = min(last, date(start.year, 12, 31))
+            first_day, last_day = day_of_year(start), day_of_year(end)
+            if first_day == MARCH_1 and not isleap(start.year):
+                first_day = FEBRUARY_29
+            result.extend(self._between(first_day, last_day))
+            start = end + timedelta(days=1)
+        return list(dict.fromkeys(result))
+
+
+def phone_digits(phone: str) -> str:
+    """
+    Returns the digits of a normalized phone. Phones in a wrong format are only stripped of non-digit characters.
+
+    :param phone: a phone number
+    :return: digits of the phone
+    """
+
+    if Phone.is_valid(phone):
+        phone = Phone.normalize(phone)
+    return re.sub(r"\D", "", phone)
+
+
+class NameIndex(RecordIndex):
+    """
+    A sorted index of record names that finds the names starting with a prefix, ignoring the case.
+
+    The sorted list is built by the first lookup, so loading many records does not pay for keeping it sorted. After
+    that, every change updates the list in place.
+    """
+
+    def __init__(self):
+        self.folded: dict[str, str] = {}
+        self.sorted_names: list[tuple[str, str]] | None = None
+
+    def add(self, key: str, record) -> None:
+        if key in self.folded:
+            return
+        folded = key.casefold()
+        self.folded[key] = folded
+        if self.sorted_names is not None:
+            insort(self.sorted_names, (folded, key))
+
+    def discard(self, key: str) -> None:
+        folded = self.folded.pop(key, None)
+        if folded is not None and self.sorted_names is not None:
+            del self.sorted_names[bisect_left(self.sorted_names, (folded, key))]
+
+    def clear(self) -> None:
+        self.folded.clear()
+        self.sorted_names = None
+
+    def with_prefix(self, prefix: str, limit: int) -> list[str]:
+        """
+        Finds the names that start with the prefix in alphabetical order.
+
+        :param prefix: first letters of a name
+        :param limit: maximal number of names to return
+        :return: the names
+        """
+
+        if self.sorted_names is None:
+            self.sorted_names = sorted((folded, key) for key, folded in self.folded.items())
+
+        prefix = prefix.casefold()
+        start = bisect_left(self.sorted_names, (prefix,))
+        result = []
+        for folded, key in self.sorted_names[start:start + limit]:
+            if not folded.startswith(prefix):
+                break
+            result.append(key)
+        return result
+
+
+class PhoneIndex(RecordIndex):
+    """
+    A reverse index of phone numbers that finds the owner of a number and all numbers that start with a prefix.
+
+    The sorted list of numbers is built by the first prefix lookup, so loading many records does not pay for keeping
+    it sorted. After that, every change updates the list in place.
+    """
+
+    def __init__(self):
+        self.owners: dict[str, str] = {}
+        self.numbers: list[str] | None = None
+        self.numbers_by_key: dict[str, list[str]] = {}
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        numbers = [phone_digits(str(phone)) for phone in record.phones]
+        self.numbers_by_key[key] = numbers
+        for number in numbers:
+            if number not in self.owners and self.numbers is not None:
+                insort(self.numbers, number)
+            self.owners[number] = key
+
+    def discard(self, key: str) -> None:
+        for number in self.numbers_by_key.pop(key, ()):
+            if self.owners.get(number) == key:
+                del self.owners[number]
+                if self.numbers is not None:
+                    del self.numbers[bisect_left(self.numbers, number)]
+
+    def clear(self) -> None:
+        self.owners.clear()
+        self.numbers = None
+        self.numbers_by_key.clear()
+
+    def owner(self, phone: str) -> str | None:
+        """
+        Finds the record that has the phone.
+
+        :param phone: a phone number in any valid format
+        :return: a name of the record or None
+        """
+
+        return self.owners.get(phone_digits(phone))
+
+    def with_prefix(self, prefix: str) -> list[str]:
+        """
+        Finds the records that have phones starting with the prefix. A prefix starting with 0 is treated as a local
+        number.
+
+        :param prefix: first digits of a phone
+        :return: names of the records in the order of their phones
+        """
+
+        prefix = re.sub(r"\D", "", prefix)
+        if prefix.startswith("0"):
+            prefix = COUNTRY_CODE + prefix
+
+        if self.numbers is None:
+            self.numbers = sorted(self.owners)
+
+        result = []
+        for number in self.numbers[bisect_left(self.numbers, prefix):]:
+            if not number.startswith(prefix):
+                break
+            result.append(self.owners[number])
+        return list(dict.fromkeys(result))
+
+
+class TagIndex(RecordIndex):
+    """
+    An index of tags that finds notes by boolean combinations of tags and counts how many notes have each tag.
+    """
+
+    OPERATORS = ("AND", "OR", "NOT")
+
+    def __init__(self):
+        self.notes_by_tag: dict[str, set[str]] = {}
+        self.tags_by_key: dict[str, set[str]] = {}
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        tags = {tag.lower() for tag in record.tags}
+        self.tags_by_key[key] = tags
+        for tag in tags:
+            self.notes_by_tag.setdefault(tag, set()).add(key)
+
+    def discard(self, key: str) -> None:
+        for tag in self.tags_by_key.pop(key, ()):
+            keys = self.notes_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self.notes_by_tag[tag]
+
+    def clear(self) -> None:
+        self.notes_by_tag.clear()
+        self.tags_by_key.clear()
+
+    def search(self, query: str) -> set[str]:
+        """
+        Finds the notes that match a query of tags combined with AND, OR and NOT. AND binds tighter than OR, and
+        tags written one after another without an operator are combined with AND.
+
+        :param query: e.g. "work AND urgent NOT done OR home"
+        :return: names of the matching notes
+        """
+
+        result = set()
+        for group in self._split_groups(query.split()):
+            result |= self._search_group(group)
+        return result
+
+    @staticmethod
+    def _split_groups(words: list[str]) -> list[list[str]]:
+        groups = [[]]
+        for word in words:
+            if word.upper() == "OR":
+                groups.append([])
+            else:
+                groups[-1].append(word)
+        return [group for group in groups if group]
+
+    def _search_group(self, words: list[str]) -> set[str]:
+        included = []
+        excluded = set()
+        negate = False
+        for word in words:
+            operator = word.upper()
+            if operator == "NOT":
+                negate = True
+                continue
+            if operator == "AND":
+                continue
+            keys = self._notes_with(word.lower())
+            if negate:
+                excluded |= keys
+                negate = False
+            else:
+                included.append(keys)
+
+        if included:
+            included.sort(key=len)
+            result = set(included[0])
+            for keys in included[1:]:
+                result &= keys
+        else:
+            result = self._all_notes()
+        return result - excluded
+
+    def _notes_with(self, tag: str) -> set[str]:
+        return self.notes_by_tag.get(tag, set())
+
+    def _all_notes(self) -> set[str]:
+        return set(self.tags_by_key)
+
+    def counts(self) -> list[tuple[str, int]]:
+        """
+        Counts the notes for every tag.
+
+        :return: pairs of a tag and its number of notes, the most popular tags first
+        """
+
+        return sorted(((tag, len(keys)) for tag, keys in self.notes_by_tag.items()), key=lambda x: (-x[1], x[0]))
+
+
+class FullTextIndex(RecordIndex):
+    """
+    A full-text index of note titles and texts that ranks notes by the BM25 relevance to a query.
+    """
+
+    K1 = 1.5
+    B = 0.75
+    TITLE_WEIGHT = 2
+
+    def __init__(self):
+        self.postings: dict[str, dict[str, int]] = {}
+        self.lengths: dict[str, int] = {}
+        self.tokens_by_key: dict[str, list[str]] = {}
+        self.total_length = 0
+
+    def add(self, key: str, record) -> None:
+        self.discard(key)
+        frequencies = Counter(tokenize(record.text))
+        for token in tokenize(record.name.value):
+            frequencies[token] += self.TITLE_WEIGHT
+
+        length = sum(frequencies.values())
+        self.lengths[key] = length
+        self.total_length += length
+        self.tokens_by_key[key] = list(frequencies)
+        for token, frequency in frequencies.items():
+            self.postings.setdefault(token, {})[key] = frequency
+
+    def discard(self, key: str) -> None:
+        length = self.lengths.pop(key, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for token in self.tokens_by_key.pop(key):
+            frequencies = self.postings[token]
+            del frequencies[key]
+            if not frequencies:
+                del self.postings[token]
+
+    def clear(self) -> None:
+        self.postings.clear()
+        self.lengths.clear()
+        self.tokens_by_key.clear()
+        self.total_length = 0
+
+    def top(self, query: str, k: int) -> list[tuple[float, str]]:
+        """
+        Finds the k notes that are the most relevant to the query.
+
+        :param query: words to search
+        :param k: maximum number of notes to return
+        :return: pairs of a score and a name of a note, the best note first
+        """
+
+        notes_count, total_length = self._statistics()
+        if not notes_count:
+            return []
+
+        average_length = total_length / notes_count
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self._postings(token)
+            if not postings:
+                continue
+            idf = log(1 + (notes_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency, length in postings:
+                norm = self.K1 * (1 - self.B + self.B * length / average_length)
+                scores[key] = scores.get(key, 0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+        return nlargest(k, ((score, key) for key, score in scores.items()))
+
+    def _statistics(self) -> tuple[int, int]:
+        return len(self.lengths), self.total_length
+
+    def _postings(self, token: str) -> list[tuple[str, int, int]]:
+        frequencies = self.postings.get(token, {})
+        return [(key, frequency, self.lengths[key]) for key, frequency in frequencies.items()]
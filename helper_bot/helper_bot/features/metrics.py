@@ -0,0 +1,267 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+# Upper bounds of the latency buckets in milliseconds. The last bucket takes everything slower.
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+PROFILE_LINES = 20
+CPU = "cpu"
+MEMORY = "memory"
+
+
+class Histogram:
+    """
+    Counts durations in fixed buckets, so that it takes the same memory however many durations it gets.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms: float) -> None:
+        self.buckets[bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, share: float) -> float:
+        """
+        Finds the bucket that holds the given share of the durations.
+
+        :param share: a number from 0 to 1, e.g. 0.95
+        :return: the upper bound of the bucket in milliseconds, or the longest duration for the last bucket
+        """
+
+        needed = share * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= needed:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "buckets": dict(zip([f"<={bound}" for bound in BUCKETS_MS] + ["inf"], self.buckets)),
+        }
+
+
+class CommandTimer:
+    """
+    Measures one command. A command that produces its pages lazily is measured until its last page is read.
+    """
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start = time.perf_counter()
+        self.deferred = False
+
+    def pages(self, result: Any) -> Any:
+        """
+        Takes the result of the command and, if it is produced page by page, keeps measuring until the pages end.
+
+        :param result: the result of the command
+        :return: the same result, with the pages wrapped so that reading them is measured
+        """
+
+        if result is None or isinstance(result, str):
+            return result
+        self.deferred = True
+        return self._timed_pages(result)
+
+    def _timed_pages(self, pages: Iterator) -> Iterator:
+        try:
+            yield from pages
+        except Exception:
+            self.metrics.count_command_error(self.name)
+            raise
+        finally:
+            self.finish()
+
+    def finish(self) -> None:
+        self.metrics.observe_command(self.name, self.start)
+
+
+class Metrics:
+    """
+    Collects the latencies of commands and of the storage, errors by their type, and how many records searches look
+    at compared to how many they find.
+    """
+
+    def __init__(self):
+        self.commands: dict[str, Histogram] = {}
+        self.command_errors = Counter()
+        self.errors = Counter()
+        self.storage: dict[str, Histogram] = {}
+        self.searches: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def command(self, name: str):
+        """
+        Measures the time of a command and counts it as failed if it raises an exception. The block gets a timer,
+        whose pages method makes the measurement of a lazy result last until its pages are read.
+
+        :param name: the feature and the command, e.g. contacts add
+        """
+
+        timer = CommandTimer(self, name)
+        try:
+            yield timer
+        except Exception:
+            self.count_command_error(name)
+            raise
+        finally:
+            if not timer.deferred:
+                timer.finish()
+
+    def count_command_error(self, name: str) -> None:
+        with self._lock:
+            self.command_errors[name] += 1
+
+    def observe_command(self, name: str, start: float) -> None:
+        self._observe(self.commands, name, start)
+
+    @contextmanager
+    def persistence(self, operation: str):
+        """
+        Measures the time of a storage operation.
+
+        :param operation: e.g. load, write or compact
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(self.storage, operation, start)
+
+    def _observe(self, histograms: dict[str, Histogram], name: str, start: float) -> None:
+        duration_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            histograms.setdefault(name, Histogram()).add(duration_ms)
+
+    def count_error(self, error: Exception) -> None:
+        with self._lock:
+            self.errors[type(error).__name__] += 1
+
+    def count_search(self, name: str, scanned: int, returned: int) -> None:
+        """
+        Counts one search.
+
+        :param name: what was searched, e.g. the file of a container
+        :param scanned: number of records the search looked at
+        :param returned: number of records it found
+        """
+
+        with self._lock:
+            totals = self.searches.setdefault(name, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += scanned
+            totals[2] += returned
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "commands": {name: dict(histogram.to_dict(), errors=self.command_errors[name])
+                             for name, histogram in sorted(self.commands.items())},
+                "errors": dict(self.errors),
+                "searches": {name: {"queries": queries, "scanned": scanned, "returned": returned}
+                             for name, (queries, scanned, returned) in sorted(self.searches.items())},
+                "storage": {name: histogram.to_dict() for name, histogram in sorted(self.storage.items())},
+            }
+
+    def report(self) -> str:
+        """
+        Formats the collected metrics as a table.
+
+        :return: the report
+        """
+
+        metrics = self.to_dict()
+        lines = ["Commands:"] if metrics["commands"] else []
+        for name, stats in metrics["commands"].items():
+            mean = stats["total_ms"] / stats["count"]
+            lines.append(f"  {name:<20} calls {stats['count']:>6}  errors {stats['errors']:>4}  mean {mean:>9.2f} ms"
+                         f"  p50 <= {stats['p50_ms']:.2f} ms  p95 <= {stats['p95_ms']:.2f} ms"
+                         f"  max {stats['max_ms']:.2f} ms")
+        if metrics["errors"]:
+            lines.append("Errors: " + ", ".join(f"{name} {count}" for name, count in metrics["errors"].items()))
+        for name, stats in metrics["searches"].items():
+            lines.append(f"Searches in {name}: {stats['queries']} queries, {stats['scanned']} records scanned, "
+                         f"{stats['returned']} returned")
+        for name, stats in metrics["storage"].items():
+            lines.append(f"Storage {name}: {stats['count']} calls, {stats['total_ms']:.1f} ms in total, "
+                         f"max {stats['max_ms']:.1f} ms")
+        if not lines:
+            return "No commands were run yet."
+        return "\n".join(lines)
+
+    def dump(self, filepath: str) -> None:
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+METRICS = Metrics()
+
+
+def profile_call(mode: str, func: Callable, *args: Any) -> tuple[Any, str]:
+    """
+    Runs a function under cProfile or tracemalloc. A result that produces pages lazily is consumed inside the
+    profiled call, so the report covers all the work.
+
+    :param mode: cpu for the hottest functions or memory for the largest allocations
+    :param func: a function to run
+    :param args: arguments of the function
+    :return: the result of the function and the report
+    """
+
+    def run() -> Any:
+        result = func(*args)
+        if result is not None and not isinstance(result, str):
+            result = list(result)
+        return result
+
+    if mode == CPU:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        return result, report.getvalue()
+
+    if mode == MEMORY:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        try:
+            result = run()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()
+        lines = [f"Peak traced memory: {peak / 1024:.1f} KiB"]
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        changes = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+        lines.extend(str(stat) for stat in changes[:PROFILE_LINES])
+        return result, "\n".join(lines)
+
+    raise ValueError(f"Unknown profile mode: {mode}. Try {CPU} or {MEMORY}.")
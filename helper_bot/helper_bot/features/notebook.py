@@ -1,11 +1,39 @@
+import copy
 from typing import Any, List
 from datetime import date
 import re
 
-from helper_bot.helper_bot.features.bot_feature import BotFeature
+from helper_bot.helper_bot.features import transfer
+from helper_bot.helper_bot.features.bot_feature import BotFeature, field_value, split_arguments
+from helper_bot.helper_bot.features.indexes import FullTextIndex, TagIndex, tokenize
 from helper_bot.helper_bot.features.records_container import RecordsContainer
 
 NAME_REGEX = re.compile(r"[a-zA-Zа-яА-Я0-9,.'\w]{2,30}")
+TOP_NOTES = 5
+SNIPPET_LENGTH = 80
+CHANGEABLE_FIELDS = ("title", "tags", "text")
+
+
+def snippet(text: str, words: list[str]) -> str:
+    """
+    Cuts a piece of the text around the first occurrence of one of the words.
+
+    :param text: a text of a note
+    :param words: normalized words to look for
+    :return: a short piece of the text
+    """
+
+    lowered = text.lower()
+    positions = [position for position in (lowered.find(word) for word in words) if position >= 0]
+    start = max(min(positions, default=0) - SNIPPET_LENGTH // 4, 0)
+    end = start + SNIPPET_LENGTH
+
+    result = text[start:end].replace("\n", " ")
+    if start > 0:
+        result = "..." + result
+    if end < len(text):
+        result += "..."
+    return result
 
 
 class NoteField:
@@ -49,6 +77,24 @@ class NoteRecord:
     def __str__(self) -> str:
         return f'{self.name.value}\n{self.text}\n{", ".join([p for p in self.tags])}\n{self.created}'
 
+    def searchable_fields(self) -> list[str]:
+        """
+        Returns the values of the fields that can be searched.
+
+        :return: a list of field values
+        """
+
+        return [self.name.value, self.text, *self.tags]
+
+    def short_fields(self) -> list[str]:
+        """
+        Returns the values of the fields that are short enough to be searched for any part of them.
+
+        :return: a list of field values
+        """
+
+        return [self.name.value, *self.tags]
+
     def change_title(self, new_title: str) -> None:
         """
         Changes the title of the note.
@@ -83,75 +129,218 @@ class Notebook(BotFeature):
     An app feature that helps users to manage their notes.
     """
 
+    NAME_COMMANDS = ("change", "remove")
+
     def __init__(self, save_file: str):
         self.save_file = save_file
         self.data = RecordsContainer(save_file)
+        self.tags = self.data.register_index(TagIndex())
+        self.full_text = self.data.register_index(FullTextIndex())
 
         super().__init__({
-            "make": (self.make_note, "notes make"),
-            "change": (self.change_note, "notes change title"),
+            "make": (self.make_note, "notes make [title=... text=... tags=...]"),
+            "change": (self.change_note, "notes change title [title=... text=... tags=...]"),
             "remove": (self.data.remove_record, "notes remove title"),
-            "show": (self.data.show_all, "notes show "),
-            "search": (self.data.search_record, "notes search tag/title/text")
+            "show": (self.data.show_all, "notes show page=N limit=N sort=name"),
+            "search": (self.data.search_record, "notes search tag/title/text"),
+            "tag": (self.find_by_tags, "notes tag work AND urgent NOT done OR home"),
+            "tags": (self.tag_cloud, "notes tags"),
+            "rank": (self.rank_notes, "notes rank words"),
+            "import": (self.import_notes, "notes import file.csv/file.jsonl"),
+            "export": (self.export_notes, "notes export file.csv/file.jsonl")
             })
 
     @staticmethod
     def name():
         return "notes"
 
-    def make_note(self) -> str:
+    def make_note(self, *args: str) -> str:
         """
-        Creates a new note. Raises exception if note with a given title already exists.
+        Creates a new note. Takes the fields as title=, text= and tags= options, or asks for them one by one if the
+        command is given without options. Raises exception if note with a given title already exists.
 
+        :param args: fields of the note as key=value pairs
         :return: success message
         """
 
-        title = input('Enter the title: ').strip()
+        options = self.command_options(args)
+        title = field_value(options, "title", "Enter the title: ")
 
         if self.data.record_exists(title):
-            raise f"Note {title} already exists! Try another name."
+            raise ValueError(f"Note {title} already exists! Try another name.")
 
-        text = input('Enter the text: ')
-        tags = input('Enter the tags: ').strip().split()
+        text = field_value(options, "text", "Enter the text: ")
+        tags = field_value(options, "tags", "Enter the tags: ").replace(",", " ").split()
         note = NoteRecord(title, text, tags)
         self.data.add_record(note)
         return f"Note {title} was created successfully!"
 
     def change_note(self, *args: str) -> str:
         """
-        Changes existing notes. Raises exception if a note that the user wants to change does not exist.
+        Changes existing notes. The new values can be given as title=, tags= and text= options after the title,
+        otherwise the user is asked what to change. Raises exception if a note that the user wants to change does not
+        exist.
 
-        :param args: note title
+        :param args: note title and optionally the new values
         :return: success message
         """
 
-        title = " ".join(args)
-        if self.data.record_exists(title):
-            note_to_change = self.data[title]
-            while True:
-                to_change = input("What do you want to change? Type title, tags or text: ")
-                if to_change.lower() not in ["title", "tags", "text"]:
-                    print("Unknown command")
-                    continue
-                elif to_change.lower() == "title":
-                    new_title = input("Enter a new title: ")
-                    note_to_change.change_title(new_title)
-                    self.data.add_record(note_to_change)
-                    self.data.remove_record(title)
-                elif to_change.lower() == "tags":
-                    new_tags = input("Enter new tags: ")
-                    note_to_change.change_tags(new_tags)
-                elif to_change.lower() == "text":
-                    new_text = input("Enter new text here: ")
-                    note_to_change.change_text(new_text)
-
-                to_continue = input("Do you want to change something else in this note? Enter y or n: ")
-                if to_continue.lower() not in ["y", "n"]:
-                    print("Enter y or n.")
-                    continue
-                elif to_continue.lower() == "y":
-                    continue
-                else:
-                    return "The note was changed successfully!"
-        else:
+        title, options = split_arguments(args)
+        if not self.data.record_exists(title):
             raise KeyError("Note with this title doesn't exist.")
+
+        note_to_change = self.data[title]
+        if options:
+            # The fields are changed on a copy, so that an invalid value leaves the saved note as it was.
+            changed = copy.deepcopy(note_to_change)
+            for field, value in options.items():
+                self._change_field(changed, field, value)
+            self._save_note(changed, title)
+            return "The note was changed successfully!"
+        if not self.interactive:
+            raise ValueError("Give the new values as options, e.g. tags=work.")
+
+        while True:
+            to_change = input("What do you want to change? Type title, tags or text: ")
+            if to_change.lower() not in CHANGEABLE_FIELDS:
+                print("Unknown command")
+                continue
+            new_value = input(f"Enter new {to_change.lower()}: ")
+            changed = copy.deepcopy(note_to_change)
+            self._change_field(changed, to_change.lower(), new_value)
+            self._save_note(changed, note_to_change.name.value)
+            note_to_change = changed
+
+            to_continue = input("Do you want to change something else in this note? Enter y or n: ")
+            if to_continue.lower() not in ["y", "n"]:
+                print("Enter y or n.")
+                continue
+            elif to_continue.lower() == "y":
+                continue
+            else:
+                return "The note was changed successfully!"
+
+    def _change_field(self, note: NoteRecord, field: str, value: str) -> None:
+        if field == "title":
+            if self.data.record_exists(value) and value != note.name.value:
+                raise ValueError(f"Note {value} already exists! Try another name.")
+            note.change_title(value)
+        elif field == "tags":
+            note.change_tags(*value.replace(",", " ").split())
+        elif field == "text":
+            note.change_text(value)
+        else:
+            raise ValueError(f"Unknown field: {field}. Type title, tags or text.")
+
+    def _save_note(self, note: NoteRecord, old_title: str) -> None:
+        # A renamed note is saved under the new title and removed under the old one with one write.
+        if note.name.value == old_title:
+            self.data.update_record(note)
+            return
+        with self.data.batch():
+            self.data.add_record(note)
+            self.data.remove_record(old_title)
+
+    def find_by_tags(self, *args: str) -> str:
+        """
+        Finds the notes by a combination of tags with AND, OR and NOT.
+
+        :param args: the query, e.g. work AND urgent NOT done
+        :return: found notes as a string
+        """
+
+        if not args:
+            raise ValueError("Enter the tags to search.")
+
+        notes = [self.data[title] for title in sorted(self.tags.search(" ".join(args)))]
+        if notes:
+            return "\n".join(["\n" + str(note) for note in notes])
+        else:
+            return "Sorry, couldn't find any notes with these tags."
+
+    def tag_cloud(self) -> str:
+        """
+        Shows all tags with the number of notes for each of them.
+
+        :return: tags and their counts as a string
+        """
+
+        counts = self.tags.counts()
+        if counts:
+            return ", ".join(f"{tag}: {count}" for tag, count in counts)
+        else:
+            return "You don't have any tags yet."
+
+    def rank_notes(self, *args: str) -> str:
+        """
+        Finds the notes that are the most relevant to the given words and shows a short piece of each of them.
+
+        :param args: words to search
+        :return: the best notes with snippets as a string
+        """
+
+        if not args:
+            raise ValueError("Enter the words to search.")
+
+        query = " ".join(args)
+        words = tokenize(query)
+        result = []
+        for score, title in self.full_text.top(query, TOP_NOTES):
+            note = self.data[title]
+            result.append(f"{note.name.value} ({score:.2f})\n{snippet(note.text, words)}")
+        if result:
+            return "\n\n".join(result)
+        else:
+            return "Sorry, couldn't find any notes that match the query."
+
+    def import_notes(self, *args: str) -> str:
+        """
+        Imports notes from a CSV or JSONL file record by record. Rows that can't be imported are written to a report
+        file next to the imported one.
+
+        :param args: path to the file
+        :return: a summary of the import
+        """
+
+        path = " ".join(args)
+        extension = transfer.file_format(path, (transfer.CSV, transfer.JSONL))
+        report_path = path + transfer.ERRORS_SUFFIX
+
+        def make_note(row: dict) -> NoteRecord:
+            note = NoteRecord((row.get("title") or "").strip(), row.get("text") or "",
+                              transfer.split_values(row.get("tags")))
+            if row.get("created"):
+                note.created = date.fromisoformat(row["created"].strip())
+            return note
+
+        try:
+            with open(path, "r", encoding=transfer.READ_ENCODING, newline="") as f:
+                imported, failed = transfer.import_rows(self.data, transfer.read_rows(f, extension), make_note,
+                                                        report_path)
+        except OSError as err:
+            return f"Could not import {path}: {err.strerror}."
+        return transfer.import_summary(imported, failed, report_path)
+
+    def export_notes(self, *args: str) -> str:
+        """
+        Exports all notes to a CSV or JSONL file record by record.
+
+        :param args: path to the file
+        :return: success message
+        """
+
+        path = " ".join(args)
+        extension = transfer.file_format(path, (transfer.CSV, transfer.JSONL))
+        rows = ({
+            "title": note.name.value,
+            "text": note.text,
+            "tags": list(note.tags),
+            "created": note.created.isoformat()
+        } for note in self.data.values())
+
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                count = transfer.write_rows(f, extension, rows, transfer.NOTE_FIELDS)
+        except OSError as err:
+            return f"Could not export to {path}: {err.strerror}."
+        return f"Exported {count} notes to {path}"
@@ -1,7 +1,16 @@
 import os.path
-import pickle
+import threading
+import time
 from collections import UserDict
-from helper_bot.helper_bot.features.data_presentation import RecordsPresenter
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, Iterator
+
+from helper_bot.helper_bot.features.bot_feature import parse_options
+from helper_bot.helper_bot.features.data_presentation import RecordsPresenter, PAGE_SIZE
+from helper_bot.helper_bot.features.indexes import NameIndex, RecordIndex, TokenIndex, TrigramIndex
+from helper_bot.helper_bot.features.metrics import METRICS
+from helper_bot.helper_bot.features.storage import DELETE, PUT, RecordStorage, make_storage
 
 
 class RecordsContainer(UserDict):
@@ -11,46 +20,263 @@ class RecordsContainer(UserDict):
 
     def __init__(self, save_file):
         super().__init__()
-        self.data = RecordsContainer.load_data(save_file) or {}
+        self.storage = make_storage(save_file)
+        # The records are loaded on first access.
+        self.data = None
+        self.lock = threading.RLock()
+        self.autosaved = False
+        self.saved_at = time.monotonic()
         self.presenter = RecordsPresenter()
+        self.indexes = []
+        self.token_index = self.register_index(TokenIndex())
+        self.trigram_index = self.register_index(TrigramIndex())
+        self.name_index = self.register_index(NameIndex())
+
+    @property
+    def data(self) -> dict:
+        """
+        The records, loaded from the storage on first access so that creating a container costs nothing.
+        """
+
+        if self._data is None:
+            self.load()
+        return self._data
+
+    @data.setter
+    def data(self, value: dict) -> None:
+        self._data = value
+
+    def __setstate__(self, state: dict) -> None:
+        # Older versions pickled the whole container, which kept its records in data rather than in _data.
+        if "data" in state:
+            state = dict(state)
+            state.setdefault("_data", state.pop("data"))
+        self.__dict__.update(state)
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    def load(self) -> None:
+        """
+        Loads the records and fills the registered indexes with them unless it is already done.
+        """
+
+        with self.lock:
+            if self._data is not None:
+                return
+            self._fill(RecordsContainer.load_data(self.storage))
+
+    def _fill(self, data) -> None:
+        memory_indexes = [index for index in self.indexes if not index.persistent]
+        if memory_indexes:
+            for record in data.values():
+                for index in memory_indexes:
+                    index.add(record.name.value, record)
+        self._data = data
+
+    def refresh(self) -> set[str] | None:
+        """
+        Merges the changes that other apps saved to the same files since the records were loaded or last refreshed.
+        Only the changed records are replaced, unless the storage cannot tell which records have changed, and then
+        all of them are loaded again.
+
+        :return: names of the changed records, or None if all records were loaded again
+        """
+
+        with self.lock:
+            if self._data is None:
+                return set()
+            changes = self.storage.changes()
+            if changes is None:
+                for index in self.indexes:
+                    if not index.persistent:
+                        index.clear()
+                self._fill(RecordsContainer.load_data(self.storage))
+                return None
+
+            changed = set()
+            for operation, payload in changes:
+                if operation == PUT:
+                    key = payload.name.value
+                    self._data.pop(key, None)
+                    self._data[payload.name] = payload
+                    self._index_record(payload)
+                elif operation == DELETE:
+                    key = payload
+                    self._data.pop(key, None)
+                    self._unindex_record(key)
+                else:
+                    continue
+                changed.add(key)
+            return changed
 
     @classmethod
-    def load_data(cls, filepath: str) -> None | dict:
+    def load_data(cls, storage: RecordStorage) -> dict:
         """
-        Loads records from a file.
+        Loads records from the snapshot and replays the journal of changes made after it.
 
-        :param filepath: a backup file
+        :param storage: a storage of the records
         """
-        if not os.path.exists(filepath):
-            return None
 
-        with open(filepath, 'rb') as f:
+        return storage.load()
+
+    def values(self):
+        # Storages that read the records lazily give them out without keeping every record in memory.
+        return self.data.values()
+
+    def register_index(self, index: RecordIndex) -> RecordIndex:
+        """
+        Adds an index that is kept in sync with the records and fills it with the existing records. If the records are
+        not loaded yet, the index is filled when they are. The storage may replace the index with one that queries
+        the storage, so the returned index must be used instead of the given one.
+
+        :param index: an index to register
+        :return: the registered index
+        """
+
+        index = self.storage.index_for(index)
+        if self.loaded and not index.persistent:
+            for record in self._data.values():
+                index.add(record.name.value, record)
+        self.indexes.append(index)
+        return index
+
+    def _index_record(self, record) -> None:
+        for index in self.indexes:
+            index.add(record.name.value, record)
+
+    def _unindex_record(self, key: str) -> None:
+        for index in self.indexes:
+            index.discard(key)
+
+    @property
+    def dirty(self) -> bool:
+        """
+        Checks if there are changes that are not in the snapshot yet.
+        """
+
+        return self.storage.journal_entries > 0
+
+    @property
+    def unsaved_changes(self) -> int:
+        """
+        The number of changes that are not synced to the disk yet.
+        """
+
+        return self.storage.unsynced
+
+    def save(self) -> bool:
+        """
+        Syncs the changes appended to the journal since the last save to the disk. The journal is compacted into a
+        new snapshot only when the storage finds it long enough, so a save costs as much as the changes rather than
+        the whole container. Does nothing while a batch of changes is in progress in another thread.
+
+        :return: True if the changes were saved
+        """
+
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            if not self.unsaved_changes or self.storage.in_batch:
+                return False
+            self.storage.sync()
+            if self.storage.needs_compaction(len(self.data)):
+                with self.storage.locked():
+                    # The snapshot must keep the changes that other apps made since the last refresh.
+                    self.refresh()
+                    self.storage.compact(self.data)
+            self.saved_at = time.monotonic()
+            return True
+        finally:
+            self.lock.release()
+
+    def backup_data(self) -> None:
+        """
+        Compacts the journal of changes into a new snapshot of the records.
+        """
+
+        with self.lock, self.storage.locked():
+            self.refresh()
+            if self.dirty:
+                self.storage.compact(self.data)
+                self.saved_at = time.monotonic()
+            self.storage.close()
+
+    def _save_change(self) -> None:
+        # An autosaver compacts the journal in the background, so the changes are never delayed by a snapshot.
+        if not self.autosaved and self.storage.journal_entries and self.storage.needs_compaction(len(self.data)):
+            self.storage.compact(self.data)
+            self.saved_at = time.monotonic()
+
+    @contextmanager
+    def _changing(self, key: str):
+        """
+        Locks the storage for a change of a record after merging the changes of the other apps. If another app has
+        changed the same record since it was last refreshed, the change is refused rather than overwriting theirs.
+
+        :param key: a name of the changed record
+        """
+
+        with self.lock, self.storage.locked():
+            self.load()
+            changed = self.refresh()
+            if changed and key in changed:
+                raise ValueError(f"{key} was just changed in another window. Check it and try again.")
+            yield
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the changes made inside the block into one write to the journal. Other apps cannot change the files
+        until the block ends.
+        """
+
+        with self.lock, self.storage.locked():
+            self.refresh()
+            self.storage.begin_batch()
             try:
-                loaded_data = pickle.load(f)
-                return loaded_data
-            except EOFError:
-                pass
-        return None
+                yield self
+            finally:
+                self.storage.end_batch()
+                self._save_change()
 
-    @staticmethod
-    def backup_data(handler) -> None:
+    def add_records(self, records: Iterable) -> None:
         """
-        Saves records to a file.
+        Adds several records with one write to the journal.
 
-        :param handler: whose dara to save
+        :param records: records to add
         """
 
-        with open(handler.save_file, 'wb') as f:
-            pickle.dump(handler.data, f)
+        with self.batch():
+            for record in records:
+                self.add_record(record)
 
     def add_record(self, record) -> None:
         """
-        Adds a new record.
+        Adds a new record and appends it to the journal.
+
+        :param record: a record to add
+        """
+
+        with self._changing(record.name.value):
+            self.data[record.name] = record
+            self._index_record(record)
+            self.storage.put(record)
+            self._save_change()
+
+    def update_record(self, record) -> None:
+        """
+        Saves the changes made to the fields of an existing record, or a changed copy of it in place of the record.
 
-        :param record:
-        :return:
+        :param record: a changed record
         """
-        self.data[record.name] = record
+
+        with self._changing(record.name.value):
+            self.data[record.name] = record
+            self._index_record(record)
+            self.storage.put(record)
+            self._save_change()
 
     def remove_record(self, *args: str) -> str:
         """
@@ -60,11 +286,14 @@ class RecordsContainer(UserDict):
         """
 
         record_name = " ".join(args)
-        if self.record_exists(record_name):
+        with self._changing(record_name):
+            if not self.record_exists(record_name):
+                raise KeyError(f"{record_name} was not found!")
             del self.data[record_name]
-            return f"{record_name} was deleted successfully!"
-        else:
-            raise KeyError(f"{record_name} was not found!")
+            self._unindex_record(record_name)
+            self.storage.delete(record_name)
+            self._save_change()
+        return f"{record_name} was deleted successfully!"
 
     def record_exists(self, record_name: str) -> bool:
         """
@@ -76,27 +305,82 @@ class RecordsContainer(UserDict):
 
         return record_name in self.data
 
-    def show_all(self) -> str:
+    def show_all(self, *args: str) -> str | Iterator[str]:
         """
-        Shows all existing records.
+        Shows existing records page by page. Takes the options page=N to show only one page, limit=N to set the
+        number of records on a page and sort=name to order the records by name instead of the order of adding.
 
-        :return: all records as a string
+        :param args: options as key=value pairs
+        :return: a page of records as a string or all pages one by one
         """
 
-        if self.data:
-            return self.presenter.show_data(self.data)
-        else:
+        if not self.data:
             return "You don't have any data yet."
 
-    def search_record(self, needle: str) -> str:
+        options = parse_options(args)
+        limit = int(options.get("limit", PAGE_SIZE))
+        if limit < 1:
+            raise ValueError("Limit must be a positive number.")
+
+        sort = options.get("sort")
+        if sort is None:
+            records = iter(self.data.values())
+        elif sort == "name":
+            records = (self.data[key] for key in sorted(self.data, key=lambda name: name.value.lower()))
+        else:
+            raise ValueError(f"Unknown sort order: {sort}. Try sort=name.")
+
+        if "page" not in options:
+            return self.presenter.show_data(records, limit)
+
+        page = int(options["page"])
+        if page < 1:
+            raise ValueError("Page must be a positive number.")
+        records = islice(records, (page - 1) * limit, page * limit)
+        return next(self.presenter.show_data(records, limit), "There are no records on this page.")
+
+    def search_record(self, *args: str) -> str:
         """
-        Searches and returns a record that contains a needle.
+        Searches and returns the records whose fields contain a needle. When the trigram index covers only the short
+        fields, the records whose fields contain all the words of the needle are added, otherwise they are only
+        searched if nothing contains the whole needle. If there are none, falls back to scanning the records for the
+        needle as a substring of the whole record, e.g. of the text of a note or of a creation date that is not
+        indexed.
 
-        :param needle: what to search
+        :param args: what to search
         :return: a result string
         """
-        result = list(filter(lambda record: needle.lower() in str(record).lower(), self.data.values()))
+
+        self.load()
+        needle = " ".join(args)
+        if len(needle) >= TrigramIndex.MIN_QUERY_LENGTH:
+            found = self.trigram_index.search(needle)
+        else:
+            found = self.trigram_index.scan(needle)
+        scanned = self.trigram_index.scanned
+        if self.trigram_index.short_fields_only or not found:
+            words_found = self.token_index.search(needle)
+            scanned += len(words_found)
+            found |= words_found
+
+        result = [self.data[key] for key in sorted(found)]
+        if not result:
+            result = self.scan_records(needle)
+            scanned += len(self.data)
+        METRICS.count_search(os.path.basename(self.storage.filepath), scanned, len(result))
         if result:
             return "\n".join(["\n" + str(r) for r in result])
         else:
             return "Sorry, couldn't find any records that match the query."
+
+    def scan_records(self, needle: str) -> list:
+        """
+        Returns the records that contain a needle as a substring. Formats every record, so it is much slower than
+        the index search.
+
+        :param needle: what to search
+        :return: a list of found records
+        """
+
+        needle = needle.lower()
+        return [record for record in self.data.values() if needle in str(record).lower()]
@@ -1,7 +1,19 @@
+import errno
+import gzip
+import hashlib
+import json
+import multiprocessing
 import re
 import os
 import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple
 
 CYRILLIC_SYMBOLS = (
     "а", "б", "в", "г", "д", "е", "ё", "ж", "з", "и", "й", "к", "л", "м", "н", "о", "п", "р", "с", "т", "у",
@@ -31,6 +43,22 @@ VIDEO_DIR = "video"
 DOCUMENTS_DIR = "documents"
 ARCHIVES_DIR = "archives"
 
+IGNORED_FOLDERS = (IMAGE_DIR, VIDEO_DIR, DOCUMENTS_DIR, AUDIO_DIR, ARCHIVES_DIR)
+MANIFEST_FILE = ".sorter_manifest.json"
+MANIFEST_VERSION = 1
+CATEGORIES = ((IMAGES, IMAGE_DIR), (VIDEOS, VIDEO_DIR), (DOCS, DOCUMENTS_DIR), (AUDIO, AUDIO_DIR))
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+HASH_CHUNK_SIZE = 64 * 1024
+HASH_BUFFER_SIZE = 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+MAX_EXTRACTED_SIZE = 4 * 1024 ** 3
+MAX_ARCHIVE_MEMBERS = 100_000
+WATCH_INTERVAL = 2.0
+WATCH_SETTLE_TIME = 1.0
+# What the archive modules raise for damaged archives.
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, gzip.BadGzipFile, zlib.error, EOFError)
+
 
 def normalized_name(filename: str) -> str:
     """
@@ -47,6 +75,22 @@ def normalized_name(filename: str) -> str:
     return new_name + path.suffix
 
 
+def unique_path(path: str) -> str:
+    """
+    Adds a number to the name if the path is already taken.
+
+    :param path: desired path
+    :return: a path that does not exist
+    """
+    stem, suffix = os.path.splitext(path)
+    candidate = path
+    number = 0
+    while os.path.lexists(candidate):
+        number += 1
+        candidate = f"{stem}_{number}{suffix}"
+    return candidate
+
+
 def organize(f: str, path: str, folder_name: str) -> None:
     """
     Organizes the given file into corresponding folder depending on the file extension.
@@ -56,76 +100,705 @@ def organize(f: str, path: str, folder_name: str) -> None:
     :param folder_name: name of a folder to move the file to
     """
     new_path = os.path.join(path, folder_name)
-    if os.path.exists(new_path):
-        shutil.move(f, os.path.join(new_path, os.path.basename(f)))
-    else:
-        os.mkdir(os.path.join(path, folder_name))
-        shutil.move(f, os.path.join(new_path, os.path.basename(f)))
+    os.makedirs(new_path, exist_ok=True)
+    shutil.move(f, unique_path(os.path.join(new_path, os.path.basename(f))))
 
 
 def organize_archive(f: str, path: str) -> None:
     """
-    Moves the archive to the "archives" directory, unpacks it into the folder and deletes the original archive.
+    Unpacks the archive into a folder inside the "archives" directory and deletes the original archive.
 
     :param f: path to the archive
     :param path: path to the directory where the file is
     """
     new_path = os.path.join(path, ARCHIVES_DIR)
-    if os.path.exists(new_path):
-        new_addr = os.path.join(new_path, os.path.basename(f))
-        shutil.move(f, new_addr)
-        shutil.unpack_archive(new_addr, os.path.join(new_addr, os.path.splitext(new_addr)[0]))
-        os.remove(new_addr)
-    else:
-        os.mkdir(os.path.join(path, ARCHIVES_DIR))
-        new_addr = os.path.join(new_path, os.path.basename(f))
-        shutil.move(f, new_addr)
-        shutil.unpack_archive(new_addr, os.path.join(new_addr, os.path.splitext(new_addr)[0]))
-        os.remove(new_addr)
+    os.makedirs(new_path, exist_ok=True)
+    extract_archive(f, unique_path(os.path.join(new_path, archive_stem(os.path.basename(f)))))
+
+
+class ArchiveSink:
+    """
+    Receives the members of an archive one by one, sorts them into category folders and enforces the limits on the
+    number of members and on the total extracted size.
+    """
+
+    def __init__(self, root: str, max_size: int, max_members: int):
+        self.root = root
+        self.max_size = max_size
+        self.max_members = max_members
+        self.size = 0
+        self.members = 0
+        self.names = {}
+
+    def add(self, member_name: str, stream: BinaryIO) -> None:
+        """
+        Copies a member of the archive into its category folder in chunks.
+
+        :param member_name: path of the member inside the archive
+        :param stream: content of the member
+        """
+        self.members += 1
+        if self.members > self.max_members:
+            raise ValueError(f"The archive has more than {self.max_members} files.")
+
+        filename = normalized_name(os.path.basename(member_name.rstrip("/")))
+        extension = Path(filename).suffix.lower()
+        folder_name = ARCHIVES_DIR if extension in ARCHIVES else category_folder(extension) or ""
+        folder_path = os.path.join(self.root, folder_name)
+        if folder_path not in self.names:
+            os.makedirs(folder_path, exist_ok=True)
+            self.names[folder_path] = set()
+
+        taken = self.names[folder_path]
+        stem, suffix = os.path.splitext(filename)
+        candidate = filename
+        number = 0
+        while candidate in taken:
+            number += 1
+            candidate = f"{stem}_{number}{suffix}"
+        taken.add(candidate)
+
+        with open(os.path.join(folder_path, candidate), "wb") as target:
+            while chunk := stream.read(COPY_BUFFER_SIZE):
+                self.size += len(chunk)
+                if self.size > self.max_size:
+                    raise ValueError(f"The archive unpacks to more than {self.max_size} bytes.")
+                target.write(chunk)
+
+
+def _extract_zip(f: str, sink: ArchiveSink) -> None:
+    with zipfile.ZipFile(f) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > sink.max_members:
+            raise ValueError(f"The archive has more than {sink.max_members} files.")
+        for info in members:
+            with archive.open(info) as stream:
+                sink.add(info.filename, stream)
+
+
+def _extract_tar(f: str, sink: ArchiveSink) -> None:
+    # The stream mode reads the archive strictly forward, so memory use does not depend on the archive size.
+    with tarfile.open(f, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                sink.add(member.name, archive.extractfile(member))
 
 
-def is_empty_dir(directory):
+def _extract_gzip(f: str, sink: ArchiveSink) -> None:
+    with gzip.open(f, "rb") as stream:
+        sink.add(Path(f).stem, stream)
+
+
+def extract_archive(f: str, destination: str, max_size: int = MAX_EXTRACTED_SIZE,
+                    max_members: int = MAX_ARCHIVE_MEMBERS) -> None:
     """
-    Checks if the directory is empty.
+    Unpacks the archive member by member into a temporary folder next to the destination, sorting the members into
+    category folders. When everything is unpacked, renames the temporary folder to the destination and deletes the
+    archive. If unpacking fails or the archive exceeds the limits, the temporary folder is removed and the archive is
+    left untouched. A damaged archive raises ValueError whatever its format.
 
-    :param directory: path to the directory
-    :return: True if the directory is empty, False otherwise
+    :param f: path to the archive
+    :param destination: path to the folder to unpack the archive into
+    :param max_size: maximum total size of the unpacked files in bytes
+    :param max_members: maximum number of files in the archive
     """
-    return len(os.listdir(directory)) == 0
+    tmp_path = tempfile.mkdtemp(prefix=f".{os.path.basename(destination)}.", suffix=".tmp",
+                                dir=os.path.dirname(destination))
+    try:
+        sink = ArchiveSink(tmp_path, max_size, max_members)
+        if zipfile.is_zipfile(f):
+            _extract_zip(f, sink)
+        elif tarfile.is_tarfile(f):
+            _extract_tar(f, sink)
+        elif f.lower().endswith(".gz"):
+            _extract_gzip(f, sink)
+        else:
+            raise ValueError(f"Unknown archive format: {f}")
+        os.rename(tmp_path, destination)
+    except ARCHIVE_ERRORS as err:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise ValueError(f"Can't unpack {os.path.basename(f)}, the archive is damaged: {err}") from err
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    os.remove(f)
 
 
-def sort_folder(path) -> None:
+def archive_stem(filename: str) -> str:
     """
-    Iterates recursively over folders in the given path and organizes the files found in the folders according to their
-    extensions.
+    Returns the name of the archive without the archive extension, e.g. "photos" for "photos.tar.gz".
+
+    :param filename: name of the archive
+    :return: name without extension
+    """
+    for extension in sorted(ARCHIVES, key=len, reverse=True):
+        if filename.lower().endswith(extension):
+            return filename[:-len(extension)]
+    return Path(filename).stem
+
+
+def category_folder(extension: str) -> str | None:
+    """
+    Finds the folder for files with the given extension.
+
+    :param extension: lowercase extension of a file
+    :return: name of the folder or None if the files with this extension are not sorted
+    """
+    for extensions, folder_name in CATEGORIES:
+        if extension in extensions:
+            return folder_name
+    return None
+
+
+class Move(NamedTuple):
+    source: str
+    destination: str
+
+
+class Rename(NamedTuple):
+    source: str
+    destination: str
+
+
+class Extract(NamedTuple):
+    source: str
+    destination: str
+
+
+class SortPlan:
+    """
+    Everything that sorting a folder is going to do: folders to create, files to move into category folders, files
+    to rename in place, archives to extract and empty folders to remove.
+    """
+
+    def __init__(self, root: str, manifest: dict | None = None):
+        self.root = root
+        self.folders = []
+        self.moves = []
+        self.renames = []
+        self.extractions = []
+        self.removed_dirs = []
+        self.names = {}
+        self.entries = 0
+        self.syscalls = 0
+
+        # Bookkeeping of the incremental mode: directories from the previous run, directories that did not change
+        # since then and subdirectories of the scanned directories.
+        self.manifest = manifest
+        self.unchanged_dirs = {}
+        self.scanned_dirs = {}
+
+    @property
+    def incremental(self) -> bool:
+        return self.manifest is not None
+
+    def scan(self, path: str) -> list[os.DirEntry]:
+        """
+        Lists the directory once and remembers the names of its entries.
+
+        :param path: path to the directory
+        :return: entries of the directory sorted by name
+        """
+        self.syscalls += 1
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        self.names[path] = {entry.name for entry in entries}
+        self.entries += len(entries)
+        return entries
+
+    def folder(self, path: str, folder_name: str) -> str:
+        """
+        Returns the path to a category folder inside the directory and plans to create it if it doesn't exist.
+
+        :param path: path to the directory that has already been scanned
+        :param folder_name: name of the category folder
+        :return: path to the category folder
+        """
+        folder_path = os.path.join(path, folder_name)
+        if folder_path not in self.names:
+            if folder_name in self.names[path]:
+                self.syscalls += 1
+                with os.scandir(folder_path) as it:
+                    self.names[folder_path] = {entry.name for entry in it}
+            else:
+                self.folders.append(folder_path)
+                self.names[folder_path] = set()
+        return folder_path
+
+    def claim(self, folder_path: str, name: str) -> str:
+        """
+        Reserves a name in the folder that is not taken by an existing entry or by another step of the plan. Adds a
+        number to the name if it is taken, so the same tree is always sorted the same way.
+
+        :param folder_path: path to a folder that has been scanned or planned
+        :param name: desired name
+        :return: a free path
+        """
+        taken = self.names[folder_path]
+        stem, suffix = os.path.splitext(name)
+        candidate = name
+        number = 0
+        while candidate in taken:
+            number += 1
+            candidate = f"{stem}_{number}{suffix}"
+        taken.add(candidate)
+        return os.path.join(folder_path, candidate)
+
+    def describe(self) -> Iterator[str]:
+        """
+        Describes the steps of the plan in the order they are executed.
+
+        :return: one line per step
+        """
+        for folder in self.folders:
+            yield f"mkdir {folder}"
+        for step in self.moves:
+            yield f"move {step.source} -> {step.destination}"
+        for step in self.renames:
+            yield f"rename {step.source} -> {step.destination}"
+        for step in self.extractions:
+            yield f"extract {step.source} -> {step.destination}"
+        for directory in self.removed_dirs:
+            yield f"rmdir {directory}"
+        yield f"{self.entries} entries scanned with {self.syscalls} directory reads."
+
+
+def build_plan(path: str, manifest: dict | None = None) -> SortPlan:
+    """
+    Walks the folder and plans how to sort it without changing anything on disk. Every directory is read once with
+    os.scandir, and the types of entries are taken from the directory listing.
+
+    In the incremental mode, directories whose modification time matches the manifest of the previous run are not
+    read at all, only their subdirectories are checked.
 
     :param path: path to the root directory
+    :param manifest: manifest of the previous run to sort incrementally, or None to sort everything
+    :return: the plan of sorting
+    """
+    plan = SortPlan(path, manifest)
+    mtime_ns = None
+    if plan.incremental:
+        plan.syscalls += 1
+        mtime_ns = os.stat(path).st_mtime_ns
+    _plan_folder(path, plan, mtime_ns)
+    return plan
+
+
+def _plan_folder(path: str, plan: SortPlan, mtime_ns: int | None = None) -> bool:
+    """
+    Plans sorting of one folder and its subfolders.
+
+    :return: True if the folder is going to be empty after sorting
     """
-    ignored_folders = [IMAGE_DIR, VIDEO_DIR, DOCUMENTS_DIR, AUDIO_DIR, ARCHIVES_DIR]
-    for filename in os.listdir(path):
-        f = os.path.join(path, filename)
-        if os.path.isdir(f):
-            if filename in ignored_folders:
+    if plan.incremental:
+        relative_path = os.path.relpath(path, plan.root)
+        known = plan.manifest["dirs"].get(relative_path)
+        if known and known["mtime_ns"] == mtime_ns:
+            _plan_unchanged_folder(path, relative_path, known, plan)
+            return False
+
+    empty = True
+    subdirs = []
+    for entry in plan.scan(path):
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name in IGNORED_FOLDERS:
+                empty = False
                 continue
-            if is_empty_dir(f):
-                os.rmdir(f)
+
+            subdir_mtime_ns = None
+            if plan.incremental:
+                plan.syscalls += 1
+                subdir_mtime_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+            if _plan_folder(entry.path, plan, subdir_mtime_ns):
+                plan.removed_dirs.append(entry.path)
             else:
-                sort_folder(f)
-                if is_empty_dir(f):
-                    os.rmdir(f)
-        else:
-            new_path = os.path.join(path, normalized_name(f))
-            if not os.path.exists(new_path):
-                os.rename(f, new_path)
-            extension = Path(new_path).suffix.lower()
-
-            if extension in IMAGES:
-                organize(new_path, path, IMAGE_DIR)
-            elif extension in VIDEOS:
-                organize(new_path, path, VIDEO_DIR)
-            elif extension in DOCS:
-                organize(new_path, path, DOCUMENTS_DIR)
-            elif extension in AUDIO:
-                organize(new_path, path, AUDIO_DIR)
-            elif extension in ARCHIVES:
-                organize_archive(new_path, path)
+                empty = False
+                subdirs.append(entry.name)
+        elif not entry.name.startswith(MANIFEST_FILE):
+            empty = False
+            _plan_file(entry, path, plan)
+
+    plan.scanned_dirs[path] = subdirs
+    return empty
+
+
+def _plan_unchanged_folder(path: str, relative_path: str, known: dict, plan: SortPlan) -> None:
+    plan.unchanged_dirs[relative_path] = known
+    for subdir in known["subdirs"]:
+        subdir_path = os.path.join(path, subdir)
+        plan.syscalls += 1
+        try:
+            subdir_mtime_ns = os.stat(subdir_path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if _plan_folder(subdir_path, plan, subdir_mtime_ns):
+            plan.removed_dirs.append(subdir_path)
+
+
+def _plan_file(entry: os.DirEntry, path: str, plan: SortPlan) -> None:
+    new_name = normalized_name(entry.name)
+    extension = Path(new_name).suffix.lower()
+    folder_name = category_folder(extension)
+
+    if extension in ARCHIVES:
+        archives_path = plan.folder(path, ARCHIVES_DIR)
+        plan.extractions.append(Extract(entry.path, plan.claim(archives_path, archive_stem(new_name))))
+    elif folder_name:
+        folder_path = plan.folder(path, folder_name)
+        plan.moves.append(Move(entry.path, plan.claim(folder_path, new_name)))
+    elif new_name != entry.name:
+        plan.renames.append(Rename(entry.path, plan.claim(path, new_name)))
+
+
+def move_file(source: str, destination: str) -> None:
+    """
+    Moves the file with a single rename. Falls back to copying if the destination is on another file system.
+
+    :param source: path to the file
+    :param destination: new path to the file
+    """
+    try:
+        os.rename(source, destination)
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+        shutil.move(source, destination)
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Creates a pool of processes that are not forked from the app. Forking copies the locks held by the other threads
+    of the app, such as the autosave and the completion, and a child could wait for them forever. The fork server is
+    used where it is available and starting the processes anew elsewhere.
+
+    :param workers: maximum number of processes
+    :return: the pool
+    """
+
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1),
+                               mp_context=multiprocessing.get_context(method))
+
+
+def execute_plan(plan: SortPlan, workers: int = DEFAULT_WORKERS) -> list[tuple[str, Exception]]:
+    """
+    Carries out the plan. Files are moved by a pool of threads, archives are extracted by a pool of processes.
+
+    :param plan: the plan of sorting
+    :param workers: maximum number of threads and processes
+    :return: pairs of a path and an error for the files that could not be sorted
+    """
+    for folder in plan.folders:
+        os.mkdir(folder)
+
+    # The process pool starts its processes only when the first archive is submitted.
+    with ThreadPoolExecutor(max_workers=workers) as threads, process_pool(workers) as processes:
+        tasks = [(step.source, threads.submit(move_file, *step)) for step in plan.moves + plan.renames]
+        tasks += [(step.source, processes.submit(extract_archive, *step)) for step in plan.extractions]
+        errors = [(source, task.exception()) for source, task in tasks if task.exception() is not None]
+
+    for directory in plan.removed_dirs:
+        os.rmdir(directory)
+    return errors
+
+
+def load_manifest(path: str) -> dict:
+    """
+    Loads the manifest of the previous incremental run. Returns an empty manifest if there was no run yet or the
+    manifest can't be read.
+
+    :param path: path to the sorted root directory
+    :return: the manifest
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if not manifest or manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "dirs": {}}
+    return manifest
+
+
+def save_manifest(plan: SortPlan, errors: list[tuple[str, Exception]] = ()) -> None:
+    """
+    Saves the state of the directories after the plan has been executed. The directories where a step failed are
+    left out, so the next run reads them again and retries the files.
+
+    :param plan: an executed incremental plan
+    :param errors: pairs of a path and an error for the files that could not be sorted
+    """
+    manifest_path = os.path.join(plan.root, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        # Creating the manifest changes the modification time of the root, so it is done before the times are taken.
+        open(manifest_path, "w", encoding="utf-8").close()
+
+    removed_dirs = set(plan.removed_dirs)
+    skipped_dirs = removed_dirs | {os.path.dirname(source) for source, _ in errors}
+    dirs = dict(plan.unchanged_dirs)
+    for path, subdirs in plan.scanned_dirs.items():
+        if path in skipped_dirs:
+            continue
+        dirs[os.path.relpath(path, plan.root)] = {
+            "mtime_ns": os.stat(path).st_mtime_ns,
+            "subdirs": [subdir for subdir in subdirs if os.path.join(path, subdir) not in removed_dirs]
+        }
+
+    # Rewriting the existing file leaves the modification time of the root as it was taken. A manifest left
+    # incomplete by a crash can't be read, and the next run sorts everything.
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "dirs": dirs}, f)
+
+
+def partial_hash(f: str) -> str:
+    """
+    Hashes the first and the last chunks of the file. Files not bigger than two chunks are hashed whole.
+
+    :param f: path to the file
+    :return: hex digest
+    """
+    digest = hashlib.blake2b()
+    with open(f, "rb") as file:
+        digest.update(file.read(HASH_CHUNK_SIZE))
+        size = os.fstat(file.fileno()).st_size
+        if size > HASH_CHUNK_SIZE:
+            file.seek(max(size - HASH_CHUNK_SIZE, HASH_CHUNK_SIZE))
+            digest.update(file.read(HASH_CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(f: str) -> str:
+    """
+    Hashes the whole file reading it through a fixed buffer, so memory use does not depend on the file size.
+
+    :param f: path to the file
+    :return: hex digest
+    """
+    digest = hashlib.blake2b()
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(f, "rb", buffering=0) as file:
+        while read := file.readinto(buffer):
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def _category_files(path: str) -> Iterator[os.DirEntry]:
+    """
+    Finds all files inside the category folders of the tree.
+    """
+    with os.scandir(path) as it:
+        entries = list(it)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name in IGNORED_FOLDERS:
+                yield from _all_files(entry.path)
+            else:
+                yield from _category_files(entry.path)
+
+
+def _all_files(path: str) -> Iterator[os.DirEntry]:
+    with os.scandir(path) as it:
+        entries = list(it)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _all_files(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            yield entry
+
+
+def _group_by_hash(groups: list[list[str]], hash_function, processes: ProcessPoolExecutor) -> list[list[str]]:
+    """
+    Splits the groups of files further by a hash of their content. Keeps only the groups of two or more files.
+    """
+    files = [f for group in groups for f in group]
+    hashes = dict(zip(files, processes.map(hash_function, files, chunksize=16)))
+    result = []
+    for group in groups:
+        by_hash = {}
+        for f in group:
+            by_hash.setdefault(hashes[f], []).append(f)
+        result.extend(same for same in by_hash.values() if len(same) > 1)
+    return result
+
+
+def find_duplicates(path: str, workers: int = DEFAULT_WORKERS) -> list[list[str]]:
+    """
+    Finds byte-identical files in the category folders of the sorted tree. Files are grouped by size first, so a file
+    of a unique size is never read. Files of the same size are compared by a hash of their first and last chunks and
+    only then by a hash of the whole content. Hashing is done by a pool of processes.
+
+    :param path: path to the sorted root directory
+    :param workers: maximum number of processes
+    :return: groups of identical files, each sorted by path
+    """
+    by_size = {}
+    seen_inodes = set()
+    for entry in _category_files(path):
+        stat = entry.stat(follow_symlinks=False)
+        # Empty files are all equal, and files that are already hard links of each other are not duplicates.
+        if stat.st_size == 0 or (stat.st_dev, stat.st_ino) in seen_inodes:
+            continue
+        seen_inodes.add((stat.st_dev, stat.st_ino))
+        by_size.setdefault(stat.st_size, []).append(entry.path)
+
+    # Files not bigger than two chunks are hashed whole by partial_hash already.
+    small = [sorted(group) for size, group in by_size.items() if len(group) > 1 and size <= 2 * HASH_CHUNK_SIZE]
+    large = [sorted(group) for size, group in by_size.items() if len(group) > 1 and size > 2 * HASH_CHUNK_SIZE]
+    if not small and not large:
+        return []
+
+    with process_pool(workers) as processes:
+        groups = _group_by_hash(small, partial_hash, processes)
+        groups += _group_by_hash(_group_by_hash(large, partial_hash, processes), full_hash, processes)
+    return sorted(groups)
+
+
+def link_duplicates(groups: list[list[str]]) -> int:
+    """
+    Replaces every duplicate with a hard link to the first file of its group. Each replacement is atomic.
+
+    :param groups: groups of identical files
+    :return: number of bytes freed
+    """
+    freed = 0
+    for original, *duplicates in groups:
+        for duplicate in duplicates:
+            tmp_path = duplicate + ".link.tmp"
+            os.link(original, tmp_path)
+            freed += os.path.getsize(duplicate)
+            os.replace(tmp_path, duplicate)
+    return freed
+
+
+def sort_folder(path, workers: int = DEFAULT_WORKERS, incremental: bool = False) -> list[tuple[str, Exception]]:
+    """
+    Iterates recursively over folders in the given path and organizes the files found in the folders according to their
+    extensions. First plans the sorting, then executes the plan in parallel.
+
+    :param path: path to the root directory
+    :param workers: maximum number of threads and processes
+    :param incremental: skip the directories that did not change since the previous incremental run
+    :return: pairs of a path and an error for the files that could not be sorted
+    """
+    plan = build_plan(path, load_manifest(path) if incremental else None)
+    errors = execute_plan(plan, workers)
+    if incremental:
+        save_manifest(plan, errors)
+    return errors
+
+
+class FolderWatcher:
+    """
+    Keeps a folder sorted by polling the modification times of its directories. Only the directories that changed
+    are read again, and only the new files go through sorting. A file is sorted when its size and modification time
+    stay the same for the settle time, so files that are still being written are left alone.
+    """
+
+    def __init__(self, path: str, settle_time: float = WATCH_SETTLE_TIME):
+        self.root = path
+        self.settle_time = settle_time
+        self.dir_mtimes = {}
+        self.pending = {}
+        self.failed = set()
+
+    def poll(self) -> Iterator[str]:
+        """
+        Checks the directories for changes once and sorts the files that became stable.
+
+        :return: messages about the sorted files
+        """
+        self._check_dir(self.root)
+        for directory in list(self.dir_mtimes):
+            if directory != self.root:
+                self._check_dir(directory)
+        yield from self._sort_stable_files()
+
+    def watch(self, interval: float = WATCH_INTERVAL) -> Iterator[str]:
+        """
+        Polls the folder until interrupted with Ctrl+C.
+
+        :param interval: seconds between polls
+        :return: messages about the sorted files
+        """
+        try:
+            while True:
+                yield from self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            yield "Stopped watching the folder."
+
+    def _check_dir(self, directory: str) -> None:
+        # A directory that disappears or cannot be read is forgotten, and read again if it is there on the next poll.
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            if self.dir_mtimes.get(directory) == mtime_ns:
+                return
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            self.dir_mtimes.pop(directory, None)
+            return
+
+        self.dir_mtimes[directory] = mtime_ns
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_FOLDERS and entry.path not in self.dir_mtimes:
+                        self._check_dir(entry.path)
+                elif not entry.name.startswith(MANIFEST_FILE) and self._needs_sorting(entry.name):
+                    stat = entry.stat(follow_symlinks=False)
+                    self._track(entry.path, (stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                continue
+
+    @staticmethod
+    def _needs_sorting(filename: str) -> bool:
+        new_name = normalized_name(filename)
+        extension = Path(new_name).suffix.lower()
+        return new_name != filename or extension in ARCHIVES or category_folder(extension) is not None
+
+    def _track(self, f: str, signature: tuple[int, int]) -> None:
+        known = self.pending.get(f)
+        if known is None or known[0] != signature:
+            self.pending[f] = (signature, time.monotonic())
+
+    def _sort_stable_files(self) -> Iterator[str]:
+        now = time.monotonic()
+        for f, (signature, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(f)
+            except OSError:
+                del self.pending[f]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[f] = (current, now)
+                continue
+            if now - since < self.settle_time or (f, current) in self.failed:
+                continue
+
+            del self.pending[f]
+            try:
+                yield self._sort_file(f)
+            except (OSError, ValueError) as err:
+                self.failed.add((f, current))
+                yield f"Could not sort {f}: {err}"
+
+    def _sort_file(self, f: str) -> str:
+        directory = os.path.dirname(f)
+        new_path = os.path.join(directory, normalized_name(os.path.basename(f)))
+        if new_path != f:
+            new_path = unique_path(new_path)
+            os.rename(f, new_path)
+
+        extension = Path(new_path).suffix.lower()
+        folder_name = category_folder(extension)
+        if extension in ARCHIVES:
+            organize_archive(new_path, directory)
+            return f"Unpacked {f} into {os.path.join(directory, ARCHIVES_DIR)}"
+        elif folder_name:
+            organize(new_path, directory, folder_name)
+            return f"Moved {f} to {os.path.join(directory, folder_name)}"
+        return f"Renamed {f} to {new_path}"
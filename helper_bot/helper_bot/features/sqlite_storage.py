@@ -0,0 +1,538 @@
+import pickle
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Iterator
+
+from helper_bot.helper_bot.features.indexes import BirthdayIndex, FullTextIndex, NameIndex, PhoneIndex, \
+    RecordIndex, TagIndex, TokenIndex, TrigramIndex, COUNTRY_CODE, day_of_year, phone_digits, searchable_text, \
+    tokenize
+from helper_bot.helper_bot.features.metrics import METRICS
+from helper_bot.helper_bot.features.storage import DELETE, PUT, RecordStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    folded TEXT NOT NULL,
+    email TEXT,
+    birthday INTEGER,
+    length INTEGER,
+    text TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_folded ON records (folded);
+CREATE INDEX IF NOT EXISTS records_email ON records (email);
+CREATE INDEX IF NOT EXISTS records_birthday ON records (birthday);
+CREATE TABLE IF NOT EXISTS phones (number TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (number, key));
+CREATE INDEX IF NOT EXISTS phones_key ON phones (key);
+CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+CREATE INDEX IF NOT EXISTS tags_key ON tags (key);
+"""
+# Full-text tables share the rowid of the records. They are only created if SQLite is built with FTS5. The documents
+# are stored as the words found by tokenize, and the tokenizer keeps them as they are, so that the notes are ranked the
+# same way as by the full-text index in memory.
+TRIGRAMS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS trigrams USING fts5(text, tokenize='trigram')"
+DOCUMENTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    title, body, tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_terms USING fts5vocab(documents, instance);
+"""
+UPSERT = """
+INSERT INTO records (key, folded, email, birthday, length, text, body) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET folded = excluded.folded, email = excluded.email, birthday = excluded.birthday,
+    length = excluded.length, text = excluded.text, body = excluded.body
+"""
+PAGE_ROWS = 1000
+# Records kept in memory after they are read, the least recently used ones are dropped first.
+CACHED_RECORDS = 256
+# Older builds of SQLite take at most 999 parameters in a query.
+MAX_PARAMETERS = 500
+# Seconds to wait for another app to commit before giving up on a write.
+BUSY_TIMEOUT = 30
+# Greater than any character, so that every string starting with a prefix is less than the prefix followed by it.
+LAST_CHARACTER = "\U0010ffff"
+
+
+def record_key(key) -> str:
+    """
+    Returns the name of a record as a string whether it is given as a string or as a Name or Title field.
+    """
+
+    return key if isinstance(key, str) else key.value
+
+
+def fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class RecordKey(str):
+    """
+    A name of a record read from the database. It has a value like the Name and Title fields, which are the keys of the
+    records loaded into a dict, so the code written for them works with it too.
+    """
+
+    @property
+    def value(self) -> str:
+        return str(self)
+
+
+class SQLiteStorage(RecordStorage):
+    """
+    Keeps the records in an SQLite database, so they do not have to fit in memory or be loaded at start.
+
+    Every change is committed right away, or at the end of a batch, in the WAL mode. The names, phones, emails,
+    birthdays and tags are kept in indexed columns and the texts in FTS5 tables, so the indexes of a container
+    backed by this storage query the database instead of holding the records in memory.
+
+    SQLite itself locks the database for several apps, and the apps read each other's changes from it. Only the
+    records kept by SQLiteRecords have to be checked when another app commits.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._has_trigrams = False
+        self._has_documents = False
+        self._connection = None
+        self._batch_depth = 0
+        self._data_version = None
+        self._records = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connect()
+        return self._connection
+
+    def _connect(self) -> None:
+        # The connection is shared with the autosave and the completion threads, so it is guarded by the lock.
+        connection = sqlite3.connect(self.filepath, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self._has_trigrams = self._create_virtual_table(connection, TRIGRAMS_SCHEMA)
+        self._has_documents = self._create_virtual_table(connection, DOCUMENTS_SCHEMA)
+        self._connection = connection
+
+    # The full-text tables are created when the database is opened, so checking them opens it.
+    @property
+    def has_trigrams(self) -> bool:
+        return self.connection is not None and self._has_trigrams
+
+    @property
+    def has_documents(self) -> bool:
+        return self.connection is not None and self._has_documents
+
+    @staticmethod
+    def _create_virtual_table(connection: sqlite3.Connection, schema: str) -> bool:
+        try:
+            connection.executescript(schema)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        """
+        Runs a query and returns all its rows.
+
+        :param sql: the query
+        :param parameters: values of its placeholders
+        :return: the rows
+        """
+
+        with METRICS.persistence("sqlite read"), self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def load(self) -> MutableMapping:
+        """
+        Returns a mapping that reads the records from the database when they are accessed.
+
+        :return: records keyed by their names
+        """
+
+        with METRICS.persistence("load"):
+            self._data_version = self._read_data_version()
+            self._records = SQLiteRecords(self)
+            return self._records
+
+    def _read_data_version(self) -> int:
+        with self._lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def changes(self) -> list[tuple[str, object]] | None:
+        """
+        Finds the kept records that another app has changed since they were read. The data version of SQLite changes
+        with every commit of another connection, so the records are only compared when it has changed.
+
+        :return: put and delete entries for the changed records
+        """
+
+        data_version = self._read_data_version()
+        if data_version == self._data_version or self._records is None:
+            return []
+        self._data_version = data_version
+        return self._records.changed()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._batch_depth:
+                yield self.connection
+                return
+            connection = self.connection
+            connection.execute("BEGIN")
+            try:
+                yield connection
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def put(self, record) -> None:
+        """
+        Saves a new or changed record together with the columns that its indexes search.
+
+        :param record: a record to save
+        """
+
+        key = record.name.value
+        text = searchable_text(record).lower()
+        birthday = getattr(record, "birthday", None)
+        email = getattr(record, "email", None)
+        title_words, body_words, length = None, None, None
+        if hasattr(record, "text"):
+            title_words, body_words = tokenize(key), tokenize(record.text)
+            length = len(body_words) + FullTextIndex.TITLE_WEIGHT * len(title_words)
+        row = (key, key.casefold(), None if email is None else str(email),
+               None if birthday is None else day_of_year(birthday.value), length, text, pickle.dumps(record))
+        with METRICS.persistence("sqlite write"), self._transaction() as connection:
+            connection.execute(UPSERT, row)
+            rowid = connection.execute("SELECT rowid FROM records WHERE key = ?", (key,)).fetchone()[0]
+            connection.execute("DELETE FROM phones WHERE key = ?", (key,))
+            connection.executemany("INSERT OR IGNORE INTO phones (number, key) VALUES (?, ?)",
+                                   [(phone_digits(str(phone)), key) for phone in getattr(record, "phones", ())])
+            connection.execute("DELETE FROM tags WHERE key = ?", (key,))
+            connection.executemany("INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)",
+                                   [(tag.lower(), key) for tag in getattr(record, "tags", ())])
+            if self.has_trigrams:
+                connection.execute("DELETE FROM trigrams WHERE rowid = ?", (rowid,))
+                connection.execute("INSERT INTO trigrams (rowid, text) VALUES (?, ?)", (rowid, text))
+            if self.has_documents and length is not None:
+                connection.execute("DELETE FROM documents WHERE rowid = ?", (rowid,))
+                connection.execute("INSERT INTO documents (rowid, title, body) VALUES (?, ?, ?)",
+                                   (rowid, " ".join(title_words), " ".join(body_words)))
+        if self._records is not None:
+            # The saved record is read again from the database when it is needed.
+            self._records.forget(key)
+
+    def delete(self, key: str) -> None:
+        """
+        Removes a record and its indexed columns.
+
+        :param key: a name of the removed record
+        """
+
+        with METRICS.persistence("sqlite write"), self._transaction() as connection:
+            found = connection.execute("SELECT rowid FROM records WHERE key = ?", (key,)).fetchone()
+            if found is None:
+                return
+            connection.execute("DELETE FROM records WHERE rowid = ?", found)
+            connection.execute("DELETE FROM phones WHERE key = ?", (key,))
+            connection.execute("DELETE FROM tags WHERE key = ?", (key,))
+            if self.has_trigrams:
+                connection.execute("DELETE FROM trigrams WHERE rowid = ?", found)
+            if self.has_documents:
+                connection.execute("DELETE FROM documents WHERE rowid = ?", found)
+        if self._records is not None:
+            self._records.forget(key)
+
+    @property
+    def in_batch(self) -> bool:
+        return self._batch_depth > 0
+
+    def begin_batch(self) -> None:
+        """
+        Starts a transaction that commits all the changes made before the outermost end_batch at once.
+        """
+
+        with self._lock:
+            if not self._batch_depth:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+
+    def end_batch(self) -> None:
+        with self._lock:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.connection.execute("COMMIT")
+
+    def containing(self, needles: list[str]) -> list[tuple[str, str]]:
+        """
+        Finds the records whose lowercase searchable text may contain all the needles. The trigram table is used for
+        the needles of three characters and longer, so the result has to be checked by the caller.
+
+        :param needles: lowercase substrings
+        :return: pairs of a name and a searchable text
+        """
+
+        if self.has_trigrams and all(len(needle) >= 3 for needle in needles):
+            match = " AND ".join(fts_phrase(needle) for needle in needles)
+            return self.query("SELECT records.key, records.text FROM trigrams "
+                              "JOIN records ON records.rowid = trigrams.rowid WHERE trigrams MATCH ?", (match,))
+        condition = " AND ".join(["instr(text, ?) > 0"] * len(needles))
+        return self.query(f"SELECT key, text FROM records WHERE {condition}", tuple(needles))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                if self._batch_depth:
+                    self._connection.execute("COMMIT")
+                    self._batch_depth = 0
+                self._connection.close()
+                self._connection = None
+
+    def index_for(self, index: RecordIndex) -> RecordIndex:
+        """
+        Replaces the in-memory indexes with the ones that query the database. The full-text index stays in memory if
+        SQLite has no FTS5.
+
+        :param index: an index kept in memory
+        :return: the index to register
+        """
+
+        stored = STORED_INDEXES.get(type(index))
+        if stored is None or stored is StoredFullTextIndex and not self.has_documents:
+            return index
+        return stored(self)
+
+
+class SQLiteRecords(MutableMapping):
+    """
+    The records of an SQLite storage. A record is read from the database when it is accessed and then kept in a
+    small cache of the most recently used records, so that the record being changed is the same object until it is
+    saved. Setting and deleting items only changes the kept records; the database is changed by the storage, which
+    drops a record from the cache once it is saved. Records are changed on copies, so a record dropped from the cache
+    before it is saved loses nothing.
+
+    The pickled body of every kept record is remembered as it was read, so that the records changed by other apps
+    can be told apart from the ones changed here.
+    """
+
+    def __init__(self, storage: SQLiteStorage, size: int = CACHED_RECORDS):
+        self.storage = storage
+        self.size = size
+        self.cache = OrderedDict()
+        self.bodies = {}
+
+    def __getitem__(self, key):
+        key = record_key(key)
+        record = self.cache.get(key)
+        if record is not None:
+            self.cache.move_to_end(key)
+            return record
+
+        rows = self.storage.query("SELECT body FROM records WHERE key = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        record = pickle.loads(rows[0][0])
+        self._keep(key, record)
+        self.bodies[key] = rows[0][0]
+        return record
+
+    def __setitem__(self, key, record) -> None:
+        self._keep(record_key(key), record)
+
+    def __delitem__(self, key) -> None:
+        # The body stays until the storage saves or deletes the record, so a merged change of another app is still
+        # compared with the database.
+        self.cache.pop(record_key(key), None)
+
+    def _keep(self, key: str, record) -> None:
+        self.cache[key] = record
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.size:
+            evicted, _ = self.cache.popitem(last=False)
+            self.bodies.pop(evicted, None)
+
+    def forget(self, key: str) -> None:
+        """
+        Drops a record from the cache, so that it is read from the database next time.
+
+        :param key: a name of the record
+        """
+
+        self.cache.pop(key, None)
+        self.bodies.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        key = record_key(key)
+        return key in self.cache or bool(self.storage.query("SELECT 1 FROM records WHERE key = ?", (key,)))
+
+    def __len__(self) -> int:
+        return self.storage.query("SELECT COUNT(*) FROM records")[0][0]
+
+    def __iter__(self) -> Iterator[RecordKey]:
+        for (key,) in self.storage.query("SELECT key FROM records ORDER BY rowid"):
+            yield RecordKey(key)
+
+    def changed(self) -> list[tuple[str, object]]:
+        """
+        Compares the kept records with the database and keeps the versions saved by other apps instead.
+
+        :return: put entries for the changed records and delete entries for the removed ones
+        """
+
+        entries = []
+        keys = list(self.bodies)
+        for start in range(0, len(keys), MAX_PARAMETERS):
+            chunk = keys[start:start + MAX_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            saved = dict(self.storage.query(f"SELECT key, body FROM records WHERE key IN ({placeholders})",
+                                            tuple(chunk)))
+            for key in chunk:
+                body = saved.get(key)
+                if body == self.bodies.get(key):
+                    continue
+                if body is None:
+                    self.forget(key)
+                    entries.append((DELETE, key))
+                else:
+                    self.bodies[key] = body
+                    entries.append((PUT, pickle.loads(body)))
+        return entries
+
+    def values(self) -> Iterator:
+        """
+        Reads the records in the order of adding, a page of rows at a time. The records that are not kept already
+        are not kept after reading, so going through all records takes the memory of one page.
+        """
+
+        last_rowid = 0
+        while True:
+            rows = self.storage.query("SELECT rowid, key, body FROM records WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                      (last_rowid, PAGE_ROWS))
+            for last_rowid, key, body in rows:
+                record = self.cache.get(key)
+                yield pickle.loads(body) if record is None else record
+            if len(rows) < PAGE_ROWS:
+                return
+
+
+class StoredIndex:
+    """
+    A base class for the indexes that query an SQLite storage. The storage keeps their columns up to date, so adding
+    and discarding records does nothing.
+    """
+
+    persistent = True
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+        self.scanned = 0
+
+    def add(self, key: str, record) -> None:
+        pass
+
+    def discard(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class StoredTokenIndex(StoredIndex, TokenIndex):
+
+    def search(self, query: str) -> set[str]:
+        tokens = set(tokenize(query))
+        if not tokens:
+            return set()
+        rows = self.storage.containing(sorted(tokens))
+        return {key for key, text in rows if tokens <= set(tokenize(text))}
+
+
+class StoredTrigramIndex(StoredIndex, TrigramIndex):
+
+    # The trigram table is kept with the records, so it covers all the searchable fields.
+    short_fields_only = False
+
+    def search(self, needle: str) -> set[str]:
+        needle = needle.lower()
+        rows = self.storage.containing([needle])
+        self.scanned = len(rows)
+        return {key for key, text in rows if needle in text}
+
+    def scan(self, needle: str) -> set[str]:
+        return self.search(needle)
+
+
+class StoredNameIndex(StoredIndex, NameIndex):
+
+    def with_prefix(self, prefix: str, limit: int) -> list[str]:
+        prefix = prefix.casefold()
+        rows = self.storage.query("SELECT key FROM records WHERE folded >= ? AND folded < ? ORDER BY folded, key "
+                                  "LIMIT ?", (prefix, prefix + LAST_CHARACTER, limit))
+        return [key for key, in rows]
+
+
+class StoredBirthdayIndex(StoredIndex, BirthdayIndex):
+
+    def _between(self, first_day: int, last_day: int) -> list[str]:
+        rows = self.storage.query("SELECT key FROM records WHERE birthday BETWEEN ? AND ? ORDER BY birthday, key",
+                                  (first_day, last_day))
+        return [key for key, in rows]
+
+
+class StoredPhoneIndex(StoredIndex, PhoneIndex):
+
+    def owner(self, phone: str) -> str | None:
+        rows = self.storage.query("SELECT key FROM phones WHERE number = ? LIMIT 1", (phone_digits(phone),))
+        return rows[0][0] if rows else None
+
+    def with_prefix(self, prefix: str) -> list[str]:
+        prefix = re.sub(r"\D", "", prefix)
+        if prefix.startswith("0"):
+            prefix = COUNTRY_CODE + prefix
+        rows = self.storage.query("SELECT key FROM phones WHERE number >= ? AND number < ? ORDER BY number",
+                                  (prefix, prefix + LAST_CHARACTER))
+        return list(dict.fromkeys(key for key, in rows))
+
+
+class StoredTagIndex(StoredIndex, TagIndex):
+
+    def _notes_with(self, tag: str) -> set[str]:
+        return {key for key, in self.storage.query("SELECT key FROM tags WHERE tag = ?", (tag,))}
+
+    def _all_notes(self) -> set[str]:
+        return {key for key, in self.storage.query("SELECT key FROM records")}
+
+    def counts(self) -> list[tuple[str, int]]:
+        return self.storage.query("SELECT tag, COUNT(*) AS notes FROM tags GROUP BY tag ORDER BY notes DESC, tag")
+
+
+class StoredFullTextIndex(StoredIndex, FullTextIndex):
+
+    def _statistics(self) -> tuple[int, int]:
+        notes_count, total_length = self.storage.query("SELECT COUNT(length), SUM(length) FROM records")[0]
+        return notes_count, total_length or 0
+
+    def _postings(self, token: str) -> list[tuple[str, int, int]]:
+        return self.storage.query(
+            "SELECT records.key, SUM(CASE document_terms.col WHEN 'title' THEN ? ELSE 1 END), records.length "
+            "FROM document_terms JOIN records ON records.rowid = document_terms.doc "
+            "WHERE document_terms.term = ? GROUP BY document_terms.doc", (self.TITLE_WEIGHT, token))
+
+
+STORED_INDEXES = {
+    TokenIndex: StoredTokenIndex,
+    TrigramIndex: StoredTrigramIndex,
+    NameIndex: StoredNameIndex,
+    BirthdayIndex: StoredBirthdayIndex,
+    PhoneIndex: StoredPhoneIndex,
+    TagIndex: StoredTagIndex,
+    FullTextIndex: StoredFullTextIndex,
+}
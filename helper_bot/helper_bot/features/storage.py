@@ -0,0 +1,439 @@
+import os
+import pickle
+import threading
+from abc import ABC, abstractmethod
+from collections import UserDict
+from contextlib import contextmanager, nullcontext
+from typing import MutableMapping
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, so the files are not locked there and only one app should use them at a time.
+    fcntl = None
+
+from helper_bot.helper_bot.features.metrics import METRICS
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+SQLITE_SUFFIXES = (".db", ".sqlite")
+COMPACT_EVERY = 1000
+
+PUT = "put"
+DELETE = "delete"
+# The first entry of a journal: the generation of the snapshot it belongs to and the generation and the length of the
+# journal that the snapshot was compacted from.
+HEADER = "header"
+
+
+def fsync_directory(filepath: str) -> None:
+    """
+    Makes a rename of the file durable by syncing the directory that contains it. Does nothing on the systems where
+    directories cannot be opened.
+
+    :param filepath: path to a file in the directory
+    """
+
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(filepath)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class RecordStorage(ABC):
+    """
+    A base class for the storages that keep the records of a container.
+
+    A storage loads the records as a mapping from names to records and saves every change with put and delete.
+    Storages that keep a snapshot apart from the changes report the changes that are not in the snapshot yet as
+    journal entries, and write a new snapshot in compact.
+
+    Several apps may use the same files. A container merges the changes saved by the others, which it gets from
+    changes, and writes its own changes while it holds the lock of the storage.
+    """
+
+    journal_entries = 0
+    # Changes written since the last sync or compaction, which a crash of the system might still lose.
+    unsynced = 0
+
+    @abstractmethod
+    def load(self) -> MutableMapping:
+        pass
+
+    @abstractmethod
+    def put(self, record) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @property
+    @abstractmethod
+    def in_batch(self) -> bool:
+        pass
+
+    @abstractmethod
+    def begin_batch(self) -> None:
+        pass
+
+    @abstractmethod
+    def end_batch(self) -> None:
+        pass
+
+    def needs_compaction(self, records_count: int) -> bool:
+        return False
+
+    def sync(self) -> None:
+        pass
+
+    def compact(self, records: MutableMapping) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def locked(self):
+        """
+        Keeps the other apps from changing the files inside the block.
+        """
+
+        return nullcontext()
+
+    def changes(self) -> list[tuple[str, object]] | None:
+        """
+        Reads the changes saved by other apps since the records were loaded or since the last call.
+
+        :return: put and delete entries to apply to the loaded records, or None if the records must be loaded again
+        """
+
+        return []
+
+    def index_for(self, index):
+        """
+        Returns an index that answers the same queries as the given one. A storage that can answer them itself returns
+        an index backed by the storage, which the container does not have to fill with the records.
+
+        :param index: an index kept in memory
+        :return: the index to register
+        """
+
+        return index
+
+
+def make_storage(filepath: str) -> RecordStorage:
+    """
+    Creates the storage for the file: an SQLite database for the files ending with .db or .sqlite and a pickled
+    snapshot with a journal for the others.
+
+    :param filepath: path to the file of a container
+    :return: the storage
+    """
+
+    if filepath.endswith(SQLITE_SUFFIXES):
+        # sqlite3 is only imported by the apps that use it.
+        from helper_bot.helper_bot.features.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(filepath)
+    return JournalStorage(filepath)
+
+
+class JournalStorage(RecordStorage):
+    """
+    Persists records as a pickled snapshot plus an append-only journal of changes.
+
+    Every change of a record is appended to the journal, so the cost of saving depends on the size of the change
+    rather than on the size of the whole container. When the journal grows long enough, it is compacted into a new
+    snapshot.
+
+    The journal is only written under an exclusive lock of a separate lock file, by an app that has read everything
+    the others appended before. Every app remembers which journal it has read and up to which byte, so it finds the
+    changes of the others with one stat of the journal and reads only the entries appended after its own. A compaction
+    replaces the journal with a new one that starts with a header, and an app that has read the whole replaced journal
+    goes on with the new one without loading the snapshot again.
+    """
+
+    def __init__(self, filepath: str, compact_every: int = COMPACT_EVERY):
+        self.filepath = filepath
+        self.journal_path = filepath + JOURNAL_SUFFIX
+        self.compact_every = compact_every
+        self.journal_entries = 0
+        self.unsynced = 0
+        self.generation = 0
+        self._journal = None
+        # The device and the inode of the journal that has been read up to the offset, or None without a journal.
+        self._journal_id = None
+        self._offset = 0
+        self._compacted_from = None
+        self._unmerged = []
+        self._batch_depth = 0
+        self._pending = []
+        self._lock_file = None
+        self._lock_depth = 0
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def locked(self, shared: bool = False):
+        """
+        Locks the files of the storage for this app. The lock is reentrant, and an inner block keeps the lock taken
+        by the outer one.
+
+        :param shared: lock for reading only, so that other apps can read at the same time
+        """
+
+        with self._thread_lock:
+            if not self._lock_depth and fcntl is not None:
+                if self._lock_file is None:
+                    self._lock_file = open(self.filepath + LOCK_SUFFIX, "ab")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def load(self) -> dict:
+        """
+        Loads the snapshot and replays the journal on top of it.
+
+        :return: records keyed by their names
+        """
+
+        with METRICS.persistence("load"), self.locked(shared=True):
+            return self._load()
+
+    def _load(self) -> dict:
+        records = self._load_snapshot()
+        self.close()
+        self.generation = 0
+        self.journal_entries = 0
+        self._journal_id = None
+        self._offset = 0
+        self._unmerged.clear()
+        if not os.path.exists(self.journal_path):
+            return records
+
+        self._open_journal()
+        for operation, payload in self._read_journal():
+            if operation == PUT:
+                records.pop(payload.name.value, None)
+                records[payload.name] = payload
+            elif operation == DELETE:
+                records.pop(payload, None)
+        return records
+
+    def _load_snapshot(self) -> dict:
+        if not os.path.exists(self.filepath):
+            return {}
+
+        with open(self.filepath, "rb") as f:
+            try:
+                loaded_data = pickle.load(f)
+            except EOFError:
+                return {}
+
+        # Older versions pickled the whole container instead of a plain dict.
+        while isinstance(loaded_data, UserDict):
+            loaded_data = loaded_data.data
+        return loaded_data or {}
+
+    def _open_journal(self) -> None:
+        self._journal = open(self.journal_path, "a+b")
+        stat = os.fstat(self._journal.fileno())
+        self._journal_id = (stat.st_dev, stat.st_ino)
+
+    def _read_journal(self) -> list[tuple[str, object]]:
+        entries = []
+        self._journal.seek(self._offset)
+        while True:
+            try:
+                entry = pickle.load(self._journal)
+            except (EOFError, pickle.UnpicklingError):
+                # The tail of the journal might be incomplete if an app crashed in the middle of a write.
+                break
+            self._offset = self._journal.tell()
+            if entry[0] == HEADER:
+                _, self.generation, self._compacted_from = entry
+            else:
+                entries.append(entry)
+                self.journal_entries += 1
+        return entries
+
+    def _current_journal(self) -> tuple[tuple[int, int], int] | None:
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_dev, stat.st_ino), stat.st_size
+
+    def changes(self) -> list[tuple[str, object]] | None:
+        """
+        Reads the entries that other apps appended to the journal since it was last read. If another app has
+        compacted the journal, the rest of the replaced journal is read from the file that is still open.
+
+        :return: put and delete entries, or None if the snapshot must be loaded again
+        """
+
+        current = self._current_journal()
+        if current == (self._journal_id, self._offset) and not self._unmerged:
+            return []
+        if current is None and self._journal_id is None:
+            return []
+
+        with self.locked():
+            entries, self._unmerged = self._unmerged, []
+            current = self._current_journal()
+            if current is not None and current[0] == self._journal_id:
+                if self._journal is None:
+                    self._open_journal()
+                return entries + self._read_journal()
+
+            if self._journal is not None:
+                entries += self._read_journal()
+            replaced = (self.generation, self._offset) if self._journal_id is not None else None
+            self.close()
+            if current is None:
+                # Only the older versions removed the journal, so its last entries are not known.
+                return None
+
+            generation = self.generation
+            self._compacted_from = None
+            self._offset = 0
+            self.journal_entries = 0
+            self._open_journal()
+            entries += self._read_journal()
+            # The new journal goes on from the replaced one only if this app has read all that was compacted.
+            if self._compacted_from == replaced and (replaced is not None or self.generation == generation):
+                return entries
+            return None
+
+    def put(self, record) -> None:
+        """
+        Appends a new or changed record to the journal.
+
+        :param record: a record to save
+        """
+
+        self._append((PUT, record))
+
+    def delete(self, key: str) -> None:
+        """
+        Appends a removal of a record to the journal.
+
+        :param key: a name of the removed record
+        """
+
+        self._append((DELETE, key))
+
+    def needs_compaction(self, records_count: int) -> bool:
+        """
+        Checks if the journal should be compacted. The journal is compacted when it is longer than the snapshot, so the
+        cost of compaction spread over the changes stays constant however big the container is.
+
+        :param records_count: number of records in the container
+        :return: True if the journal should be compacted
+        """
+
+        return not self._batch_depth and self.journal_entries >= max(self.compact_every, records_count)
+
+    def sync(self) -> None:
+        """
+        Makes the entries written to the journal since the last sync durable, without rewriting the snapshot.
+        """
+
+        with self._thread_lock:
+            if self.unsynced and self._journal is not None:
+                with METRICS.persistence("journal sync"):
+                    os.fsync(self._journal.fileno())
+            self.unsynced = 0
+
+    @property
+    def in_batch(self) -> bool:
+        return self._batch_depth > 0
+
+    def begin_batch(self) -> None:
+        """
+        Starts collecting the journal entries in memory instead of writing each of them separately.
+        """
+
+        self._batch_depth += 1
+
+    def end_batch(self) -> None:
+        """
+        Writes the journal entries collected since the outermost begin_batch with one write.
+        """
+
+        self._batch_depth -= 1
+        if not self._batch_depth and self._pending:
+            self._write(b"".join(self._pending))
+            self._pending.clear()
+
+    def _append(self, entry: tuple) -> None:
+        if self._batch_depth:
+            self._pending.append(pickle.dumps(entry))
+        else:
+            self._write(pickle.dumps(entry))
+        self.journal_entries += 1
+        self.unsynced += 1
+
+    def _write(self, data: bytes) -> None:
+        with METRICS.persistence("journal write"), self.locked():
+            if self._journal is None:
+                self._open_journal()
+            if os.fstat(self._journal.fileno()).st_size > self._offset:
+                # The caller has merged the changes of the other apps, but the entries it has missed are kept for the
+                # next call of changes rather than overwritten. What cannot be read is an incomplete entry left by a
+                # crash, and it is dropped so that the new entries can be read after it.
+                self._unmerged.extend(self._read_journal())
+                self._journal.truncate(self._offset)
+            if not self._offset:
+                data = pickle.dumps((HEADER, self.generation, None)) + data
+            self._journal.write(data)
+            self._journal.flush()
+            self._offset += len(data)
+
+    def compact(self, records: dict) -> None:
+        """
+        Writes all records into a new snapshot and replaces the journal with an empty one of the new generation. The
+        records must include the changes of the other apps, which are merged under the same lock.
+
+        :param records: all records of a container
+        """
+
+        with METRICS.persistence("compact"), self.locked():
+            tmp_path = self.filepath + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(dict(records), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+
+            compacted_from = (self.generation, self._offset) if self._journal_id is not None else None
+            self.generation += 1
+            header = pickle.dumps((HEADER, self.generation, compacted_from))
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            fsync_directory(self.filepath)
+
+            self.close()
+            self._pending.clear()
+            self._open_journal()
+            self._offset = len(header)
+            self.journal_entries = 0
+            self.unsynced = 0
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
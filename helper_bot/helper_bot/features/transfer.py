@@ -0,0 +1,235 @@
+import csv
+import json
+import os.path
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO
+
+CSV = ".csv"
+JSONL = ".jsonl"
+VCARD = ".vcf"
+
+BATCH_SIZE = 1000
+ERRORS_SUFFIX = ".errors.txt"
+# Spreadsheets and CRMs often start the exported files with a byte order mark, which must not become a part of the
+# first column name.
+READ_ENCODING = "utf-8-sig"
+
+CONTACT_FIELDS = ("name", "phones", "birthday", "email", "address")
+NOTE_FIELDS = ("title", "text", "tags", "created")
+
+
+def file_format(path: str, supported: tuple[str, ...]) -> str:
+    """
+    Detects the format of a file by its extension. Raises exception if the format is not supported.
+
+    :param path: path to the file
+    :param supported: supported extensions
+    :return: the extension of the file
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in supported:
+        raise ValueError(f"Unsupported file format '{extension}'. Use one of: {', '.join(supported)}.")
+    return extension
+
+
+def split_values(value: str | list | None) -> list[str]:
+    """
+    Splits a value of a list field that can be given as a list or as a string separated with spaces or semicolons.
+
+    :param value: a value of a field
+    :return: a list of values
+    """
+
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return value.replace(";", " ").split()
+
+
+def read_csv(f: TextIO) -> Iterator[tuple[int, dict]]:
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, {key.strip().lower(): value for key, value in row.items() if key}
+
+
+def read_jsonl(f: TextIO) -> Iterator[tuple[int, dict | ValueError]]:
+    """
+    Reads the rows of a JSONL file. A line that is not a JSON object is given as a ValueError, and the values that
+    are neither strings nor lists, such as numbers, are converted to strings.
+
+    :param f: an opened JSONL file
+    :return: pairs of a line number and a row or an error
+    """
+
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as err:
+            yield line_number, ValueError(f"Invalid JSON: {err}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValueError(f"Expected a JSON object, got {type(row).__name__}.")
+            continue
+        yield line_number, {str(key).lower(): value if value is None or isinstance(value, (str, list)) else str(value)
+                            for key, value in row.items()}
+
+
+def read_vcards(f: TextIO) -> Iterator[tuple[int, dict]]:
+    """
+    Reads contacts from a vCard file one card at a time.
+
+    :param f: an opened vCard file
+    :return: pairs of the line where a card starts and the fields of the card
+    """
+
+    card = None
+    start = 0
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if line.upper() == "BEGIN:VCARD":
+            card, start = {"phones": []}, line_number
+            continue
+        if card is None or ":" not in line:
+            continue
+        if line.upper() == "END:VCARD":
+            yield start, card
+            card = None
+            continue
+
+        prop, value = line.split(":", 1)
+        prop = prop.split(";", 1)[0].upper()
+        if prop == "FN":
+            card["name"] = value
+        elif prop == "TEL":
+            card["phones"].append(value)
+        elif prop == "EMAIL":
+            card["email"] = value
+        elif prop == "BDAY":
+            card["birthday"] = vcard_to_date(value)
+        elif prop == "ADR":
+            card["address"] = ", ".join(part for part in value.split(";") if part)
+
+
+def vcard_to_date(value: str) -> str:
+    digits = value.replace("-", "")
+    return f"{digits[6:8]}.{digits[4:6]}.{digits[0:4]}"
+
+
+def date_to_vcard(value: str) -> str:
+    day, month, year = value.split(".")
+    return f"{year}-{month}-{day}"
+
+
+READERS = {CSV: read_csv, JSONL: read_jsonl, VCARD: read_vcards}
+
+
+def read_rows(f: TextIO, extension: str) -> Iterator[tuple[int, dict]]:
+    """
+    Reads the rows of a file lazily, so that the whole file is never held in memory.
+
+    :param f: an opened file
+    :param extension: format of the file
+    :return: pairs of a line number and a row
+    """
+
+    return READERS[extension](f)
+
+
+def write_rows(f: TextIO, extension: str, rows: Iterable[dict], fields: tuple[str, ...]) -> int:
+    """
+    Writes the rows to a file one by one.
+
+    :param f: an opened file
+    :param extension: format of the file
+    :param rows: rows to write
+    :param fields: names of the fields
+    :return: number of written rows
+    """
+
+    count = 0
+    if extension == CSV:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: " ".join(value) if isinstance(value, list) else value for key, value in row.items()})
+            count += 1
+    elif extension == JSONL:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        for row in rows:
+            f.write(vcard(row))
+            count += 1
+    return count
+
+
+def vcard(row: dict) -> str:
+    lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{row['name']}"]
+    lines.extend(f"TEL:{phone}" for phone in row["phones"])
+    if row["email"]:
+        lines.append(f"EMAIL:{row['email']}")
+    if row["birthday"]:
+        lines.append(f"BDAY:{date_to_vcard(row['birthday'])}")
+    if row["address"]:
+        lines.append(f"ADR:;;{row['address']};;;;")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def import_rows(container, rows: Iterator[tuple[int, dict]], make_record: Callable[[dict], object],
+                report_path: str, accept: Callable[[object], None] | None = None) -> tuple[int, int]:
+    """
+    Creates records from the rows and adds them to the container in batches. Rows that fail validation are written
+    to the report file together with the reason.
+
+    :param container: a records container to fill
+    :param rows: pairs of a line number and a row
+    :param make_record: creates a record from a row and raises ValueError or KeyError if the row is invalid
+    :param report_path: path to the report of failed rows
+    :param accept: called with every record that passed all the checks and will be imported
+    :return: numbers of imported and failed rows
+    """
+
+    imported = failed = 0
+    report = None
+    try:
+        while True:
+            rows_batch = list(islice(rows, BATCH_SIZE))
+            if not rows_batch:
+                break
+
+            batch = {}
+            for line_number, row in rows_batch:
+                try:
+                    if isinstance(row, ValueError):
+                        raise row
+                    record = make_record(row)
+                    if container.record_exists(record.name.value) or record.name.value in batch:
+                        raise ValueError(f"{record.name.value} already exists.")
+                    batch[record.name.value] = record
+                    if accept is not None:
+                        accept(record)
+                except (ValueError, KeyError, TypeError, AttributeError) as err:
+                    if report is None:
+                        report = open(report_path, "w", encoding="utf-8")
+                    report.write(f"line {line_number}: {err}\n")
+                    failed += 1
+
+            container.add_records(batch.values())
+            imported += len(batch)
+    finally:
+        if report is not None:
+            report.close()
+    return imported, failed
+
+
+def import_summary(imported: int, failed: int, report_path: str) -> str:
+    result = f"Imported {imported} records."
+    if failed:
+        result += f" {failed} rows failed, see {report_path}"
+    return result
@@ -1,8 +1,14 @@
-from typing import Tuple
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+import argparse
+import shlex
+import sys
+from itertools import islice
+from typing import Iterable, TextIO, Tuple
 
-from helper_bot.helper_bot.bot import AssistantBot
+from helper_bot.helper_bot.bot import AssistantBot, PICKLE, SQLITE
+from helper_bot.helper_bot.features.metrics import METRICS
+
+STOP_WORDS = ["goodbye", "close", "exit"]
+SAVE_EVERY = 1000
 
 
 class App:
@@ -10,53 +16,127 @@ class App:
     Communicates with the user.
 
     Takes input from the user, parses it and sends it to the assistant bot. Responds with the result
-    from the bot. Terminates the app when the user inputs one of the stop words. Before terminating, saves the contacts
-    into a file and restores them from the file when run again.
+    from the bot. Terminates the app when the user inputs one of the stop words. The changed data is saved in the
+    background while the app runs and once more before it terminates, and restored from the files when run again.
     """
 
+    def __init__(self, storage: str = PICKLE):
+        self.storage = storage
+
     def run(self):
         """
         Waits for the user input in an infinite loop. Terminates when one of the stop words is given.
 
         :return: result of running the command by the bot
         """
-        bot = AssistantBot()
-        command_completer = WordCompleter(bot.autocomplete())
+        # prompt_toolkit is only needed for the interactive mode.
+        from prompt_toolkit import prompt
+        from helper_bot.helper_bot.completion import make_completer
+
+        bot = AssistantBot(self.storage)
+        command_completer = make_completer(bot)
+        bot.start_autosave()
 
         try:
             while True:
                 feature, args = self.parse_command(prompt("What do you want to do? ", completer=command_completer))
-                if feature in ["goodbye", "close", "exit"]:
-                    bot.backup_data()
+                if feature in STOP_WORDS:
                     print("Goodbye!")
                     break
-                elif feature == "help":
-                    print(bot.help())
                 else:
-                    result = bot.handle(feature, args)
-                    if result:
+                    result = bot.execute(feature, args)
+                    if isinstance(result, str):
                         print(result)
+                    elif result:
+                        for page in result:
+                            print(page)
         except Exception as err:
             print(err)
+        finally:
+            bot.backup_data()
+
+    def run_script(self, lines: Iterable[str], output: TextIO = sys.stdout, save_every: int = SAVE_EVERY):
+        """
+        Runs the commands one per line without any prompts. Every command must be given with all its fields as
+        key=value arguments; values with spaces are quoted like in a shell. Empty lines and lines starting with # are
+        skipped. The output and the changes of data are written once per save_every commands.
+
+        :param lines: commands to run
+        :param output: where to write the results
+        :param save_every: number of commands in one batch
+        """
+        bot = AssistantBot(self.storage, interactive=False)
+        lines = iter(lines)
+        stop = False
+        try:
+            while not stop:
+                commands = list(islice(lines, save_every))
+                if not commands:
+                    break
+
+                results = []
+                with bot.batch():
+                    for line in commands:
+                        line = line.strip()
+                        if not line or line.startswith("#"):
+                            continue
+                        try:
+                            feature, args = self.parse_command(line, quoted=True)
+                            if feature in STOP_WORDS:
+                                stop = True
+                                break
+                            result = bot.execute(feature, args)
+                        except Exception as err:
+                            result = f"{line}: {err}"
+                        if isinstance(result, str):
+                            results.append(result)
+                        elif result:
+                            results.extend(result)
+                if results:
+                    output.write("\n".join(results) + "\n")
+                    output.flush()
+        finally:
+            bot.backup_data()
 
     @staticmethod
-    def parse_command(user_input: str) -> Tuple[str, list[str]]:
+    def parse_command(user_input: str, quoted: bool = False) -> Tuple[str, list[str]]:
         """
         Parses the input into a feature, command, and zero or more arguments.
 
         :param user_input: a string that user provides
+        :param quoted: split the input like a shell does, so that quoted values may contain spaces
         :return: tuple(command, *args)
         """
         if len(user_input) == 0:
             raise ValueError("No command is given.")
-        user_input = user_input.split()
+        user_input = shlex.split(user_input) if quoted else user_input.split()
         command = user_input[0].lower()
         args = user_input[1:]
         return command, args
 
 
 def run_app():
-    App().run()
+    parser = argparse.ArgumentParser(prog="helper_bot", description="Personal assistant bot.")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run the commands from the file without prompts, use - to read them from stdin")
+    parser.add_argument("--save-every", type=int, default=SAVE_EVERY, metavar="N",
+                        help="in the script mode, save the data and print the output once per N commands")
+    parser.add_argument("--storage", choices=(PICKLE, SQLITE), default=PICKLE,
+                        help="keep the data in pickled files or in SQLite databases")
+    parser.add_argument("--metrics", metavar="FILE", help="write the timings of commands and storage as JSON on exit")
+    arguments = parser.parse_args()
+
+    try:
+        if arguments.script is None:
+            App(arguments.storage).run()
+        elif arguments.script == "-":
+            App(arguments.storage).run_script(sys.stdin, save_every=arguments.save_every)
+        else:
+            with open(arguments.script, "r", encoding="utf-8") as f:
+                App(arguments.storage).run_script(f, save_every=arguments.save_every)
+    finally:
+        if arguments.metrics:
+            METRICS.dump(arguments.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+import pytest
+
+from helper_bot.helper_bot.features.addressbook_fields import Phone
+
+
+@pytest.mark.parametrize("phone", ["0671234567", "380671234567", "+380671234567"])
+def test_normalizes_phone(phone):
+    assert Phone.normalize(phone) == "+380671234567"
+
+
+@pytest.mark.parametrize("phone", ["06712345678", "3806712345678999", "067123456", "067-123-4567"])
+def test_rejects_phone_that_does_not_match_entirely(phone):
+    with pytest.raises(ValueError):
+        Phone.normalize(phone)
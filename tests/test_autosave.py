@@ -0,0 +1,35 @@
+import os
+
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.autosave import Autosaver
+
+
+def test_syncs_journal_without_rewriting_snapshot(tmp_path):
+    path = str(tmp_path / "address_book.bin")
+    book = AddressBook(path)
+    book.add_contact("name=John", "phones=0671234567")
+    book.data.backup_data()
+    snapshot = os.stat(path).st_mtime_ns
+    book.change_contact("John", "address=Kyiv")
+
+    saver = Autosaver([book.data], max_changes=1)
+    saver.save_due()
+
+    assert saver.saves == 1
+    assert book.data.unsaved_changes == 0
+    assert book.data.storage.journal_entries == 1
+    assert os.stat(path).st_mtime_ns == snapshot
+
+
+def test_compacts_long_journal(tmp_path):
+    path = str(tmp_path / "address_book.bin")
+    book = AddressBook(path)
+    book.data.storage.compact_every = 3
+    book.data.autosaved = True
+    for number in range(3):
+        book.add_contact(f"name=Contact {number}", f"phones=067123456{number}")
+
+    Autosaver([book.data], max_changes=1).save_due()
+
+    assert book.data.storage.journal_entries == 0
+    assert len(AddressBook(path).data.storage.load()) == 3
@@ -0,0 +1,29 @@
+import pytest
+
+from helper_bot.helper_bot.features.notebook import Notebook
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    notebook = Notebook(str(tmp_path / "notebook.bin"))
+    notebook.prepare()
+    notebook.make_note("title=First", "text=original", "tags=work")
+    notebook.make_note("title=Second", "text=other", "tags=home")
+    return notebook
+
+
+def test_failed_change_keeps_note(notebook):
+    with pytest.raises(ValueError):
+        notebook.change_note("First", "text=changed", "title=Second")
+
+    assert notebook.data["First"].text == "original"
+    assert "First" not in notebook.data.search_record("changed")
+    assert notebook.data.unsaved_changes == 2
+
+
+def test_change_renames_note(notebook):
+    notebook.change_note("First", "text=changed", "title=Third")
+
+    assert not notebook.data.record_exists("First")
+    assert notebook.data["Third"].text == "changed"
+    assert notebook.find_by_tags("work").split() == ["Third", "changed", "work", str(notebook.data["Third"].created)]
@@ -0,0 +1,28 @@
+import pickle
+
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord
+from helper_bot.helper_bot.features.data_presentation import RecordsPresenter
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+
+
+def baseline_file(path, records) -> None:
+    # The first versions pickled the whole container, with its records in the data attribute.
+    container = RecordsContainer.__new__(RecordsContainer)
+    container.__dict__.update({"data": {record.name: record for record in records}, "presenter": RecordsPresenter()})
+    with open(path, "wb") as f:
+        pickle.dump(container, f)
+
+
+def test_loads_container_pickled_by_baseline(tmp_path):
+    record = AddressBookRecord("John")
+    record.add_phone("0671234567")
+    path = str(tmp_path / "address_book.bin")
+    baseline_file(path, [record])
+
+    book = AddressBook(path)
+    book.prepare()
+
+    assert book.data.record_exists("John")
+    assert book.find_phone_owner("0671234567") == str(record)
+    assert "John" in book.data.search_record("John")
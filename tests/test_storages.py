@@ -0,0 +1,172 @@
+import copy
+import datetime
+
+import pytest
+
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.addressbook_fields import AddressBookRecord, DATE_FORMAT
+from helper_bot.helper_bot.features.notebook import Notebook
+from helper_bot.helper_bot.features.records_container import RecordsContainer
+from helper_bot.helper_bot.features.sqlite_storage import CACHED_RECORDS, SQLiteStorage
+
+SUFFIXES = (".bin", ".db")
+
+
+def make_contact(name: str, phone: str, birthday: datetime.date = None) -> AddressBookRecord:
+    record = AddressBookRecord(name)
+    record.add_phone(phone)
+    if birthday is not None:
+        record.add_birthday(birthday.strftime(DATE_FORMAT))
+    return record
+
+
+@pytest.fixture(params=SUFFIXES, ids=("journal", "sqlite"))
+def book_file(request, tmp_path):
+    return str(tmp_path / ("address_book" + request.param))
+
+
+@pytest.fixture
+def book(book_file):
+    book = AddressBook(book_file)
+    book.prepare()
+    yield book
+    book.data.backup_data()
+
+
+@pytest.fixture(params=SUFFIXES, ids=("journal", "sqlite"))
+def notebook(request, tmp_path):
+    notebook = Notebook(str(tmp_path / ("notebook" + request.param)))
+    notebook.prepare()
+    yield notebook
+    notebook.data.backup_data()
+
+
+def test_adds_and_reads_records(book):
+    book.add_contact("name=John Smith", "phones=0671234567")
+    book.add_contact("name=Anna", "phones=0501234567")
+
+    assert len(book.data) == 2
+    assert book.data.record_exists("John Smith")
+    assert not book.data.record_exists("Nobody")
+    assert [name.value for name in book.data] == ["John Smith", "Anna"]
+    assert [record.name.value for record in book.data.values()] == ["John Smith", "Anna"]
+    assert str(book.data["Anna"].phones[0]) == "+380501234567"
+
+
+def test_refuses_duplicate_name_and_phone(book):
+    book.add_contact("name=John", "phones=0671234567")
+
+    with pytest.raises(ValueError):
+        book.add_contact("name=John", "phones=0501234567")
+    with pytest.raises(ValueError):
+        book.add_contact("name=Anna", "phones=+380671234567")
+    assert len(book.data) == 1
+
+
+def test_changes_and_removes_records(book):
+    book.add_contact("name=John", "phones=0671234567")
+    book.change_contact("John", "phone=0501234567", "email=john@gmail.com")
+
+    assert book.find_phone_owner("0501234567") == str(book.data["John"])
+    assert book.find_phone_owner("0671234567") == "No one in your phonebook has this number."
+    assert str(book.data["John"].email) == "john@gmail.com"
+
+    book.data.remove_record("John")
+    assert not book.data.record_exists("John")
+    with pytest.raises(KeyError):
+        book.data.remove_record("John")
+
+
+def test_keeps_records_after_reopening(book_file):
+    book = AddressBook(book_file)
+    book.data.add_records(make_contact(f"Contact {number}", f"067{number:07d}") for number in range(50))
+    book.data.remove_record("Contact 7")
+    book.change_contact("Contact 8", "address=Kyiv")
+    book.data.backup_data()
+
+    reopened = RecordsContainer(book_file)
+    assert len(reopened.data) == 49
+    assert not reopened.record_exists("Contact 7")
+    assert reopened.data["Contact 8"].address == "Kyiv"
+
+
+def test_searches_records(book):
+    book.add_contact("name=John Smith", "phones=0671234567", "address=Kyiv")
+    book.add_contact("name=Anna Smith", "phones=0501234567", "address=Lviv")
+
+    assert "John Smith" in book.data.search_record("ohn")
+    assert "Anna Smith" in book.data.search_record("Smith", "Lviv")
+    assert "John Smith" not in book.data.search_record("Smith", "Lviv")
+    assert "Anna Smith" in book.data.search_record("1234567")
+    assert book.data.search_record("zzzz") == "Sorry, couldn't find any records that match the query."
+
+
+def test_finds_names_phones_and_birthdays(book):
+    today = datetime.date.today()
+    book.data.add_records([
+        make_contact("John", "0671234567", today.replace(year=1990)),
+        make_contact("Johanna", "0672234567"),
+        make_contact("Anna", "0501234567"),
+    ])
+
+    assert book.data.name_index.with_prefix("jo", 10) == ["Johanna", "John"]
+    assert book.phones.with_prefix("067") == ["John", "Johanna"]
+    assert book.phones.owner("+380501234567") == "Anna"
+    assert book.birthdays.upcoming(today, 7) == ["John"]
+
+
+def test_refuses_change_of_record_changed_by_another_app(book_file):
+    book = AddressBook(book_file)
+    book.add_contact("name=John", "phones=0671234567")
+    other = AddressBook(book_file)
+    other.prepare()
+
+    contact = copy.deepcopy(book.data["John"])
+    other.change_contact("John", "address=Kyiv")
+    contact.add_address("Lviv")
+
+    with pytest.raises(ValueError):
+        book.data.update_record(contact)
+    assert book.data["John"].address == "Kyiv"
+    other.data.backup_data()
+    book.data.backup_data()
+
+
+def test_sees_records_added_by_another_app(book_file):
+    book = AddressBook(book_file)
+    book.prepare()
+    other = AddressBook(book_file)
+    other.add_contact("name=John", "phones=0671234567")
+
+    book.data.refresh()
+
+    assert book.data.record_exists("John")
+    assert book.find_phone_owner("0671234567") == str(book.data["John"])
+    other.data.backup_data()
+    book.data.backup_data()
+
+
+def test_finds_notes_by_tags_and_words(notebook):
+    notebook.make_note("title=Plan", "text=budget of the project", "tags=work urgent")
+    notebook.make_note("title=Shopping", "text=milk and bread", "tags=home")
+
+    assert notebook.find_by_tags("work", "AND", "urgent").startswith("\nPlan")
+    assert notebook.tag_cloud() == "home: 1, urgent: 1, work: 1"
+    assert notebook.rank_notes("budget").startswith("Plan")
+    assert "Shopping" in notebook.data.search_record("milk")
+
+
+def test_sqlite_keeps_a_bounded_number_of_records(tmp_path):
+    book = AddressBook(str(tmp_path / "address_book.db"))
+    count = CACHED_RECORDS * 2
+    book.data.add_records(make_contact(f"Contact {number}", f"067{number:07d}") for number in range(count))
+    records = book.data.data
+
+    assert not records.cache and not records.bodies
+    assert book.data.search_record("Contact").count("Name:") == count
+    assert len(records.cache) <= CACHED_RECORDS and len(records.bodies) <= CACHED_RECORDS
+
+    book.change_contact("Contact 1", "address=Kyiv")
+    assert "Contact 1" not in records.cache and "Contact 1" not in records.bodies
+    assert isinstance(book.data.storage, SQLiteStorage)
+    book.data.backup_data()
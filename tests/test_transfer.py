@@ -0,0 +1,25 @@
+from helper_bot.helper_bot.features.addressbook import AddressBook
+from helper_bot.helper_bot.features.notebook import Notebook
+
+
+def test_imports_csv_with_byte_order_mark(tmp_path):
+    path = tmp_path / "contacts.csv"
+    path.write_text("name,phones,email\nJohn,0671234567,john@gmail.com\nAnna,0501234567,\n", encoding="utf-8-sig")
+    book = AddressBook(str(tmp_path / "address_book.bin"))
+    book.prepare()
+
+    book.import_contacts(str(path))
+
+    assert {name.value for name in book.data} == {"Anna", "John"}
+    assert book.find_phone_owner("0671234567") == str(book.data["John"])
+
+
+def test_imports_jsonl_with_byte_order_mark(tmp_path):
+    path = tmp_path / "notes.jsonl"
+    path.write_text('{"title": "First", "text": "text", "tags": ["work"]}\n', encoding="utf-8-sig")
+    notebook = Notebook(str(tmp_path / "notebook.bin"))
+    notebook.prepare()
+
+    notebook.import_notes(str(path))
+
+    assert notebook.data["First"].tags == ["work"]